@@ -0,0 +1,126 @@
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+DEFAULT_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class Encoder(ABC):
+    """Turns a batch of texts into a (len(batch), dim) float32 matrix
+
+    `space` identifies the vector space: two encoders with the same space
+    produce comparable vectors, so stores record it and refuse to mix spaces.
+    """
+    name: str = ''
+    space: str = ''
+    dim: int = 0
+
+    @abstractmethod
+    def encode(self, batch: List[str]) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerEncoder(Encoder):
+    name = 'transformer'
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        # Imported here so the other backends don't pay for torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.space = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def __reduce__(self):
+        # Pickle by name so worker processes reload the model instead of receiving a copy
+        return (type(self), (self.model_name,))
+
+    def encode(self, batch: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(batch)), dtype=np.float32).reshape(len(batch), self.dim)
+
+
+class OnnxEncoder(SentenceTransformerEncoder):
+    """Same model run through ONNX Runtime on CPU, using the int8-quantized export when present"""
+    name = 'onnx'
+
+    def __init__(self, model_name: str = DEFAULT_MODEL,
+                 quantized_file: str = 'onnx/model_quint8_avx2.onnx'):
+        import onnxruntime  # noqa: F401 - fail fast when the runtime isn't installed
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.quantized_file = quantized_file
+        try:
+            self.model = SentenceTransformer(model_name, backend='onnx',
+                                             model_kwargs={'file_name': quantized_file})
+            variant = os.path.splitext(os.path.basename(quantized_file))[0]
+        except Exception:
+            self.model = SentenceTransformer(model_name, backend='onnx')
+            variant = 'model'
+        # Quantized vectors drift from the torch ones, so they get their own space:
+        # switching backends on an existing store has to go through reembed
+        self.space = f'{model_name}+onnx/{variant}'
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def __reduce__(self):
+        return (type(self), (self.model_name, self.quantized_file))
+
+
+class HashingEncoder(Encoder):
+    """Dependency-free hashing-trick encoder over word unigrams and bigrams
+
+    Much weaker than a sentence model, but needs no model files and encodes
+    thousands of texts per second, which is what tests, benchmarks and
+    offline runs want.
+    """
+    name = 'hashing'
+    token_pattern = re.compile(r'\w+')
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.space = f'hashing-{dim}'
+
+    def _features(self, text: str) -> List[str]:
+        tokens = self.token_pattern.findall(text.lower())
+        return tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+
+    def encode(self, batch: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(batch), self.dim), dtype=np.float32)
+        for row, text in enumerate(batch):
+            for feature in self._features(text):
+                # crc32 is stable across processes, unlike hash()
+                h = zlib.crc32(feature.encode('utf-8'))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+        # Sublinear term frequency, then unit length so dot products are cosines
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def get_encoder(name: str = None) -> Encoder:
+    """Build an encoder by name: 'transformer', 'onnx', 'hashing' or 'auto'
+
+    Defaults to the SEARCH_ENCODER environment variable, then 'auto', which
+    uses the ONNX backend when onnxruntime is installed and the transformer
+    backend otherwise. The two backends are different vector spaces, so a
+    store built with one refuses the other until it is re-embedded.
+    """
+    name = name or os.environ.get('SEARCH_ENCODER', 'auto')
+    if name == 'transformer':
+        return SentenceTransformerEncoder()
+    if name == 'onnx':
+        return OnnxEncoder()
+    if name == 'hashing':
+        return HashingEncoder()
+    if name == 'auto':
+        try:
+            return OnnxEncoder()
+        except Exception as e:
+            print(f"ONNX encoder unavailable ({e}), using the transformer backend")
+            return SentenceTransformerEncoder()
+    raise ValueError(f"Unknown encoder {name!r}; expected 'transformer', 'onnx', 'hashing' or 'auto'")
@@ -1,11 +1,22 @@
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
 import time
-from typing import Set, List
+from typing import Set, List, Callable, Optional, Dict, Iterator
 from dataclasses import dataclass
 from datetime import datetime
+import gzip
+import heapq
+import io
 import json
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+
+DISCOVERY_LINKS = 'links'
+DISCOVERY_SITEMAP = 'sitemap'
 
 @dataclass
 class UrlData:
@@ -14,31 +25,176 @@ class UrlData:
     found_at: str
     timestamp: str
     status_code: int
+    lastmod: Optional[str] = None
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a sitemap lastmod or saved timestamp into an aware datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    # Naive timestamps come from datetime.now(), i.e. local time
+    return parsed if parsed.tzinfo else parsed.astimezone()
+
+def _local_name(tag: str) -> str:
+    """Strip the XML namespace from an element tag"""
+    return tag.rsplit('}', 1)[-1]
+
+# Weights for the frontier score; see UrlFinder.score()
+INLINK_WEIGHT = 1.0
+DEPTH_WEIGHT = 0.5
+STALENESS_WEIGHT = 1.0
+STALE_AFTER_DAYS = 30
 
 class UrlFinder:
-    def __init__(self, base_url: str, max_pages: int = 10, same_domain_only: bool = True):
+    def __init__(self, base_url: str, max_pages: int = 10, same_domain_only: bool = True,
+                 discovery: str = DISCOVERY_LINKS, respect_robots: bool = True,
+                 previous_results: str = "svelte/urls.json",
+                 allow_patterns: List[str] = None, boost_patterns: Dict[str, float] = None,
+                 link_graph: str = "svelte/link_graph.json"):
+        # Fragments point into the same page, so they're dropped everywhere
+        base_url = urldefrag(base_url)[0]
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
         self.max_pages = max_pages
         self.same_domain_only = same_domain_only
+        self.discovery = discovery
+        self.respect_robots = respect_robots
         self.visited_urls: Set[str] = set()
         self.found_urls: List[UrlData] = []
+        # Called with each UrlData as it is found, so callers can stream results
+        self.on_found: Optional[Callable[[UrlData], None]] = None
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        self.robots: Dict[str, RobotFileParser] = {}
+        # Records from the last crawl, used to skip pages whose lastmod hasn't moved
+        self.previous: Dict[str, Dict] = self._load_previous(previous_results)
+        self.unchanged_urls: List[str] = []
+        
+        # Priority frontier: when set, only URLs matching an allow pattern are crawled,
+        # and each matching boost pattern adds its weight to the URL's score
+        self.allow_patterns = [re.compile(p) for p in allow_patterns or []]
+        self.boost_patterns = [(re.compile(p), w) for p, w in (boost_patterns or {}).items()]
+        self.link_graph_path = link_graph
+        self.inlinks: Dict[str, Set[str]] = self._load_link_graph(link_graph)
+        self.depth: Dict[str, int] = {}
+        self.found_at: Dict[str, str] = {}
+        # lastmod of pages listed in a sitemap, a fresher staleness signal than our own timestamps
+        self.lastmod: Dict[str, str] = {}
+        self.frontier: List[tuple] = []
+        self._pushed = 0
+        
+    def _load_link_graph(self, filename: Optional[str]) -> Dict[str, Set[str]]:
+        if not filename or not os.path.exists(filename):
+            return {}
+        with open(filename, 'r', encoding='utf-8') as f:
+            return {url: set(sources) for url, sources in json.load(f).items()}
+        
+    def save_link_graph(self, filename: str = None):
+        """Save in-links collected so far so the next crawl starts with better scores"""
+        filename = filename or self.link_graph_path
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({url: sorted(sources) for url, sources in self.inlinks.items()}, f)
+        print(f"Link graph saved to {filename}")
+        
+    def _load_previous(self, filename: Optional[str]) -> Dict[str, Dict]:
+        if not filename or not os.path.exists(filename):
+            return {}
+        with open(filename, 'r', encoding='utf-8') as f:
+            return {record['url']: record for record in json.load(f)}
+        
+    def _robots_for(self, url: str) -> RobotFileParser:
+        """Fetch and cache robots.txt for the URL's host"""
+        parsed = urlparse(url)
+        if parsed.netloc not in self.robots:
+            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+            parser = RobotFileParser(robots_url)
+            try:
+                response = requests.get(robots_url, headers=self.headers, timeout=10)
+                if response.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif response.ok:
+                    parser.parse(response.text.splitlines())
+                else:
+                    parser.allow_all = True
+            except Exception as e:
+                print(f"Could not read {robots_url}: {e}")
+                parser.allow_all = True
+            self.robots[parsed.netloc] = parser
+        return self.robots[parsed.netloc]
+    
+    def can_fetch(self, url: str) -> bool:
+        """Check robots.txt rules for a URL"""
+        if not self.respect_robots:
+            return True
+        return self._robots_for(url).can_fetch(self.headers['User-Agent'], url)
+    
+    @property
+    def crawl_delay(self) -> float:
+        """Seconds to wait between fetches, from robots.txt when it sets one"""
+        if self.respect_robots:
+            delay = self._robots_for(self.base_url).crawl_delay(self.headers['User-Agent'])
+            if delay is not None:
+                return float(delay)
+        return 1.0
         
     def is_valid_url(self, url: str) -> bool:
         """Check if URL is valid and should be processed"""
         if not url or url.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
             return False
             
-        if self.same_domain_only:
-            return urlparse(url).netloc == self.domain
+        if self.same_domain_only and urlparse(url).netloc != self.domain:
+            return False
             
-        return True
+        if self.allow_patterns and not any(p.search(url) for p in self.allow_patterns):
+            return False
+            
+        return self.can_fetch(url)
+    
+    def score(self, url: str) -> float:
+        """Crawl priority for a URL; higher scores are fetched first
+        
+        Combines in-links seen so far (log-damped), link depth from the
+        start page, URL pattern boosts, and how long ago the page was last
+        crawled. Never-crawled pages, and pages whose sitemap lastmod is newer
+        than our copy, count as fully stale.
+        """
+        score = INLINK_WEIGHT * math.log1p(len(self.inlinks.get(url, ())))
+        score -= DEPTH_WEIGHT * self.depth.get(url, 0)
+        score += sum(weight for pattern, weight in self.boost_patterns if pattern.search(url))
+        
+        previous = self.previous.get(url)
+        last_seen = _parse_time(previous['timestamp']) if previous else None
+        modified = _parse_time(self.lastmod.get(url))
+        if last_seen is None or (modified is not None and modified > last_seen):
+            staleness = 1.0
+        else:
+            age_days = (datetime.now().astimezone() - last_seen).total_seconds() / 86400
+            staleness = min(max(age_days, 0) / STALE_AFTER_DAYS, 1.0)
+        return score + STALENESS_WEIGHT * staleness
+    
+    def _push(self, url: str):
+        # Scores only grow as in-links arrive, so a re-push supersedes the old
+        # entry and stale entries are skipped when popped
+        self._pushed += 1
+        heapq.heappush(self.frontier, (-self.score(url), self._pushed, url))
+        
+    def _add_link(self, source: str, href: str):
+        """Record a link in the graph and queue its target"""
+        url = urldefrag(urljoin(source, href))[0]
+        if url == source or not self.is_valid_url(url):
+            return
+        self.inlinks.setdefault(url, set()).add(source)
+        self.depth[url] = min(self.depth.get(url, math.inf), self.depth[source] + 1)
+        self.found_at.setdefault(url, source)
+        if url not in self.visited_urls:
+            self._push(url)
     
     def get_page_data(self, url: str, found_at: str) -> None:
-        """Fetch and process a single page"""
+        """Fetch and process a single page, queueing the links it contains"""
         try:
             response = requests.get(url, headers=self.headers, timeout=10)
             response.raise_for_status()
@@ -52,51 +208,181 @@ class UrlFinder:
                 title=title.strip() if title else "No title",
                 found_at=found_at,
                 timestamp=datetime.now().isoformat(),
-                status_code=response.status_code
+                status_code=response.status_code,
+                lastmod=self.lastmod.get(url)
             )
             self.found_urls.append(url_data)
+            if self.on_found:
+                self.on_found(url_data)
             
-            # Process links if we haven't reached the limit
-            if len(self.visited_urls) < self.max_pages:
-                links = soup.find_all('a', href=True)
-                
-                for link in links:
-                    href = link['href']
-                    absolute_url = urljoin(url, href)
-                    
-                    if (self.is_valid_url(absolute_url) and 
-                        absolute_url not in self.visited_urls):
-                        self.visited_urls.add(absolute_url)
-                        self.get_page_data(absolute_url, url)
+            for link in soup.find_all('a', href=True):
+                self._add_link(url, link['href'])
                         
             # Rate limiting
-            time.sleep(1)
+            time.sleep(self.crawl_delay)
             
         except Exception as e:
             print(f"Error processing {url}: {e}")
     
     def find_urls(self) -> List[UrlData]:
         """Start the URL finding process"""
+        if self.discovery == DISCOVERY_SITEMAP:
+            # Everything unchanged still counts: the sitemap was read, there's just nothing new
+            if self.find_urls_from_sitemaps() or self.unchanged_urls:
+                return self.crawl_frontier()
+            print(f"No sitemap entries for {self.base_url}, following links instead")
+            
         print(f"Starting URL search from {self.base_url}")
-        self.visited_urls.add(self.base_url)
-        self.get_page_data(self.base_url, "starting_point")
+        self.depth[self.base_url] = 0
+        self.found_at[self.base_url] = "starting_point"
+        self._push(self.base_url)
+        return self.crawl_frontier()
+    
+    def crawl_frontier(self) -> List[UrlData]:
+        """Spend the max_pages budget on the highest-scoring queued pages first"""
+        while self.frontier and len(self.visited_urls) - len(self.unchanged_urls) < self.max_pages:
+            _, _, url = heapq.heappop(self.frontier)
+            if url in self.visited_urls:
+                continue
+            self.visited_urls.add(url)
+            self.get_page_data(url, self.found_at[url])
         return self.found_urls
     
+    def sitemap_urls(self) -> List[str]:
+        """Sitemaps listed in robots.txt, or /sitemap.xml when it lists none"""
+        parsed = urlparse(self.base_url)
+        sitemaps = self._robots_for(self.base_url).site_maps() if self.respect_robots else None
+        return sitemaps or [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"]
+    
+    def _iter_sitemap(self, sitemap_url: str) -> Iterator[tuple]:
+        """Stream (kind, loc, lastmod) entries from a sitemap or sitemap index
+        
+        The response is parsed incrementally, so large and gzipped sitemaps
+        never have to be held in memory whole.
+        """
+        response = requests.get(sitemap_url, headers=self.headers, timeout=30, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        # Left open at EOF so the BufferedReader below can finish cleanly
+        response.raw.auto_close = False
+        
+        # Decide on gzip from the bytes left after transport decoding: a .gz file
+        # served with Content-Encoding: gzip arrives here already unpacked
+        stream = io.BufferedReader(response.raw)
+        if stream.peek(2)[:2] == b'\x1f\x8b':
+            stream = gzip.GzipFile(fileobj=stream)
+        
+        try:
+            loc = lastmod = None
+            for _, elem in ET.iterparse(stream, events=('end',)):
+                name = _local_name(elem.tag)
+                if name == 'loc':
+                    loc = (elem.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = (elem.text or '').strip()
+                elif name in ('url', 'sitemap'):
+                    if loc:
+                        yield name, loc, lastmod
+                    loc = lastmod = None
+                    elem.clear()
+        finally:
+            response.close()
+    
+    def _is_unchanged(self, url: str, lastmod: Optional[str]) -> bool:
+        previous = self.previous.get(url)
+        modified = _parse_time(lastmod)
+        seen = _parse_time(previous['timestamp']) if previous else None
+        return modified is not None and seen is not None and modified <= seen
+    
+    def _skip_sitemap(self, sitemap_url: str):
+        """Carry forward the pages a child sitemap listed last time without downloading it again"""
+        for url, record in self.previous.items():
+            if record['found_at'] == sitemap_url and url not in self.visited_urls:
+                self.visited_urls.add(url)
+                self.unchanged_urls.append(url)
+    
+    def find_urls_from_sitemaps(self) -> int:
+        """Seed the frontier from robots.txt sitemaps and return how many pages were queued
+        
+        Pages whose lastmod is not newer than the previous crawl are recorded
+        in unchanged_urls and skipped, as are all pages of a child sitemap
+        that hasn't changed since it was last read. The rest compete for the
+        max_pages budget in crawl_frontier() like linked pages do, with their
+        lastmod feeding the staleness part of the score.
+        """
+        # When each sitemap was last read, from the newest record found through it;
+        # keyed by sitemap URL, so crawls of other hosts never count
+        last_read: Dict[str, datetime] = {}
+        for record in self.previous.values():
+            read_at = _parse_time(record['timestamp'])
+            if read_at and (record['found_at'] not in last_read or read_at > last_read[record['found_at']]):
+                last_read[record['found_at']] = read_at
+        
+        pending = self.sitemap_urls()
+        seen_sitemaps: Set[str] = set()
+        queued = 0
+        
+        while pending:
+            sitemap_url = pending.pop(0)
+            if sitemap_url in seen_sitemaps:
+                continue
+            if seen_sitemaps:
+                # Sitemap downloads are fetches too, so they keep to the crawl delay
+                time.sleep(self.crawl_delay)
+            seen_sitemaps.add(sitemap_url)
+            print(f"Reading sitemap {sitemap_url}")
+            
+            try:
+                for kind, loc, lastmod in self._iter_sitemap(sitemap_url):
+                    if kind == 'sitemap':
+                        modified = _parse_time(lastmod)
+                        if modified and loc in last_read and modified <= last_read[loc]:
+                            self._skip_sitemap(loc)
+                        else:
+                            pending.append(loc)
+                        continue
+                    
+                    if loc in self.visited_urls or loc in self.found_at or not self.is_valid_url(loc):
+                        continue
+                    
+                    if self._is_unchanged(loc, lastmod):
+                        self.visited_urls.add(loc)
+                        self.unchanged_urls.append(loc)
+                        continue
+                    
+                    # Listed pages sit one step from the site root, like its direct links
+                    self.depth[loc] = 1
+                    self.found_at[loc] = sitemap_url
+                    if lastmod:
+                        self.lastmod[loc] = lastmod
+                    self._push(loc)
+                    queued += 1
+            except Exception as e:
+                print(f"Error reading sitemap {sitemap_url}: {e}")
+        
+        print(f"Sitemaps listed {queued} new or changed URLs, "
+              f"{len(self.unchanged_urls)} unchanged")
+        return queued
+    
     def save_results(self, filename: str = "svelte/urls.json"):
-        """Save results to a JSON file"""
-        data = [
-            {
+        """Save results to a JSON file, merged into the records already there
+        
+        The file is shared by the finders of every site, so records this
+        finder didn't touch (other hosts, pages skipped this time) are kept.
+        """
+        records = {**self.previous, **self._load_previous(filename)}
+        for url in self.found_urls:
+            records[url.url] = {
                 "url": url.url,
                 "title": url.title,
                 "found_at": url.found_at,
                 "timestamp": url.timestamp,
-                "status_code": url.status_code
+                "status_code": url.status_code,
+                "lastmod": url.lastmod
             }
-            for url in self.found_urls
-        ]
         
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            json.dump(list(records.values()), f, indent=2, ensure_ascii=False)
         
         print(f"Results saved to {filename}")
     
@@ -110,19 +396,21 @@ class UrlFinder:
         
         print(f"URLs exported to {filename}")
 
-def main(urls):
+def main(urls, discovery: str = DISCOVERY_LINKS):
     for url in urls:    
     # Example usage
         base_url = url  # Replace with your target URL
         finder = UrlFinder(
             base_url=base_url,
             max_pages=10,  # Limit to 50 pages
-            same_domain_only=True  # Only find URLs on the same domain
+            same_domain_only=True,  # Only find URLs on the same domain
+            discovery=discovery
         )
         
         print(f"Starting URL finder for {base_url}")
         print(f"Max pages: {finder.max_pages}")
         print(f"Same domain only: {finder.same_domain_only}")
+        print(f"Discovery: {finder.discovery}")
         
         # Find URLs
         urls = finder.find_urls()
@@ -133,6 +421,7 @@ def main(urls):
         # Save both formats
         finder.save_results()  # Full JSON data
         finder.export_urls_to_txt()  # Simple comma-separated URLs
+        finder.save_link_graph()  # In-links for next run's priorities
         
         # Print some statistics
         domains = set(urlparse(url.url).netloc for url in urls)
@@ -152,4 +441,5 @@ if __name__ == "__main__":
         "https://tailwindcss.com/docs"
 
     ]
-    main(urls)
\ No newline at end of file
+    # Sitemaps list a whole site in a few downloads; sites without one fall back to link following
+    main(urls, discovery=DISCOVERY_SITEMAP)
\ No newline at end of file
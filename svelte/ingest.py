@@ -0,0 +1,237 @@
+import cProfile
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from encoders import Encoder
+from scraper import AISearchSystem, WebContent, PreparedContent
+from shards import ShardedSearchSystem
+
+# Set in each worker process by _init_worker
+_worker_system: Optional[AISearchSystem] = None
+
+
+def _init_worker(db_path: str, encoder: Encoder):
+    global _worker_system
+    # One process per core already; intra-op threads would only oversubscribe
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(1)
+    _worker_system = AISearchSystem(db_path, encoder=encoder)
+
+
+def _prepare(content: WebContent, seq: int, profile_path: str = None):
+    """Runs in a worker: returns (seq, prepared, None) or (seq, None, error text)
+
+    With profile_path the preparation is profiled and dumped there, since the
+    parent's profiler can't see into worker processes.
+    """
+    try:
+        if profile_path:
+            profile = cProfile.Profile()
+            prepared = profile.runcall(_worker_system.prepare_content, content)
+            profile.dump_stats(profile_path)
+            return seq, prepared, None
+        return seq, _worker_system.prepare_content(content), None
+    except Exception:
+        return seq, None, traceback.format_exc(limit=5)
+
+
+@dataclass
+class IngestReport:
+    stored: int = 0
+    superseded: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+class ParallelIngestor:
+    """Prepare documents in a process pool and write them through one batching writer thread
+
+    Sentence splitting, embedding and key-point extraction run in worker
+    processes; SQLite only ever sees the single writer, which commits in
+    batches. If the same URL is submitted more than once, the most recently
+    submitted version is the one that ends up stored. A document that fails
+    is reported in IngestReport.failed without affecting the rest. With a
+    ShardedSearchSystem each batch is committed once per shard it touches.
+    """
+
+    def __init__(self, search_system: Union[AISearchSystem, ShardedSearchSystem], workers: int = None,
+                 batch_size: int = 32, max_pending: int = None,
+                 on_stored: Callable[[str], None] = None,
+                 on_failed: Callable[[str, str], None] = None):
+        self.search_system = search_system
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+        self.report = IngestReport()
+
+        # Bounds documents held in memory; submit() blocks when it's used up
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._results: queue.Queue = queue.Queue()
+        self._latest: Dict[str, int] = {}
+        self._urls: Dict[int, str] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Workers only prepare documents, which is the same for every shard
+        worker_db = search_system.shards[0].db_path if isinstance(search_system, ShardedSearchSystem) \
+            else search_system.db_path
+        # spawn rather than fork: the parent may hold model and server threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(worker_db, search_system.encoder)
+        )
+        self._writer = threading.Thread(target=self._write_loop, name="ingest-writer", daemon=True)
+        self._writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, content: WebContent):
+        """Queue a document for parallel preparation and storage"""
+        if self._closed:
+            raise RuntimeError("ParallelIngestor is closed")
+        self._slots.acquire()
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._latest[content.url] = seq
+            self._urls[seq] = content.url
+
+        try:
+            # 'ingest' profiles cover preparing a document, where the CPU goes; batched writes aren't included
+            profile_path = self.search_system.profiler.claim_dump('ingest', content.url)
+            future = self.executor.submit(_prepare, content, seq, profile_path)
+        except Exception:
+            # e.g. BrokenProcessPool after a worker died: undo the bookkeeping above
+            with self._lock:
+                del self._urls[seq]
+                if self._latest.get(content.url) == seq:
+                    del self._latest[content.url]
+            self._slots.release()
+            raise
+
+        def done(f):
+            if f.exception() is not None:
+                # The worker itself died (e.g. killed or out of memory)
+                self._results.put((seq, None, repr(f.exception())))
+            else:
+                self._results.put(f.result())
+
+        future.add_done_callback(done)
+
+    def close(self) -> IngestReport:
+        """Wait for every submitted document to be written and shut the pool down"""
+        if not self._closed:
+            self._closed = True
+            self.executor.shutdown(wait=True)
+            self._results.put(None)
+            self._writer.join()
+            self.search_system.invalidate_filter_index()
+            print(f"Ingest finished: {self.report.stored} stored, "
+                  f"{len(self.report.failed)} failed, {self.report.superseded} superseded")
+        return self.report
+
+    def _write_loop(self):
+        finished = False
+        while not finished:
+            batch = [self._results.get()]
+            # Group whatever else is already waiting into the same commit
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._results.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                finished = True
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    # Keep the writer alive; a dead writer would stall every later submit()
+                    print(f"Error writing ingest batch: {e}")
+
+    def _system_for(self, url: str) -> AISearchSystem:
+        if isinstance(self.search_system, ShardedSearchSystem):
+            return self.search_system.system_for(url)
+        return self.search_system
+
+    def _write_batch(self, batch):
+        stored, failed = [], []
+        writes: Dict[AISearchSystem, List[Tuple[str, PreparedContent]]] = {}
+        try:
+            for seq, prepared, error in batch:
+                with self._lock:
+                    url = self._urls.pop(seq)
+                    is_latest = self._latest.get(url) == seq
+                    if is_latest:
+                        del self._latest[url]
+                
+                if not is_latest:
+                    self.report.superseded += 1
+                elif error is not None:
+                    failed.append((url, error))
+                else:
+                    writes.setdefault(self._system_for(url), []).append((url, prepared))
+            
+            for system, documents in writes.items():
+                written = self._write_documents(system, documents, failed)
+                if written:
+                    # Re-stored URLs get new ids, so searches mustn't keep using the old index
+                    system.invalidate_filter_index()
+                stored += written
+        finally:
+            # Always hand the slots back, or submit() blocks forever
+            for _ in batch:
+                self._slots.release()
+        
+        for url in stored:
+            self.report.stored += 1
+            if self.on_stored:
+                self.on_stored(url)
+        for url, error in failed:
+            self.report.failed[url] = error
+            print(f"Error ingesting {url}: {error.strip().splitlines()[-1]}")
+            if self.on_failed:
+                self.on_failed(url, error)
+
+    def _write_documents(self, system: AISearchSystem, documents: List[Tuple[str, PreparedContent]],
+                         failed: List[Tuple[str, str]]) -> List[str]:
+        """Write prepared documents to one database in a single commit; returns the URLs stored"""
+        stored = []
+        try:
+            with sqlite3.connect(system.db_path) as conn:
+                cursor = conn.cursor()
+                # Explicit BEGIN so releasing a savepoint doesn't commit on its own
+                cursor.execute("BEGIN")
+                for url, prepared in documents:
+                    try:
+                        # A savepoint keeps a failed write from leaving half a document behind
+                        cursor.execute("SAVEPOINT document")
+                        system.write_prepared(cursor, prepared)
+                        cursor.execute("RELEASE SAVEPOINT document")
+                        stored.append(url)
+                    except Exception:
+                        cursor.execute("ROLLBACK TO SAVEPOINT document")
+                        cursor.execute("RELEASE SAVEPOINT document")
+                        failed.append((url, traceback.format_exc(limit=5)))
+                conn.commit()
+        except sqlite3.Error as e:
+            # The batch as a whole couldn't be committed, so nothing in it was stored
+            failed.extend((url, f"Batch commit failed: {e}") for url in stored)
+            return []
+        return stored
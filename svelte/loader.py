@@ -1,4 +1,6 @@
 from scraper import AISearchSystem, WebContent
+from shards import ShardedSearchSystem
+from ingest import ParallelIngestor, IngestReport
 from datetime import datetime
 import os
 from typing import List, Dict
@@ -6,8 +8,24 @@ import json
 from pathlib import Path
 
 class DataLoader:
-    def __init__(self):
-        self.search_system = AISearchSystem()
+    def __init__(self, parallel_workers: int = 0, shard_dir: str = None):
+        # With shard_dir documents are routed into the shards there instead of knowledge_base.db
+        self.search_system = ShardedSearchSystem(shard_dir) if shard_dir else AISearchSystem()
+        # With parallel_workers > 0 documents are prepared in a process pool;
+        # call close() to wait for them to be written
+        self.ingestor = ParallelIngestor(self.search_system, workers=parallel_workers) if parallel_workers else None
+    
+    def _store(self, web_content: WebContent):
+        if self.ingestor:
+            self.ingestor.submit(web_content)
+        else:
+            self.search_system.store_content(web_content)
+    
+    def close(self) -> IngestReport:
+        """Finish any parallel ingest still in flight"""
+        if self.ingestor:
+            return self.ingestor.close()
+        return IngestReport()
     
     def add_text_file(self, file_path: str, title: str = None, tags: List[str] = None):
         """Add content from a text file"""
@@ -25,7 +43,7 @@ class DataLoader:
             }
         )
         
-        self.search_system.store_content(web_content)
+        self._store(web_content)
         print(f"Added content from: {file_path}")
     
     def add_directory(self, dir_path: str, extensions: List[str] = None):
@@ -56,7 +74,7 @@ class DataLoader:
             }
         )
         
-        self.search_system.store_content(web_content)
+        self._store(web_content)
         print(f"Added markdown from: {file_path}")
     
     def add_web_url(self, url: str, tags: List[str] = None):
@@ -65,7 +83,7 @@ class DataLoader:
             web_content = self.search_system.scrape_url(url)
             if tags:
                 web_content.metadata['tags'].extend(tags)
-            self.search_system.store_content(web_content)
+            self._store(web_content)
             print(f"Added content from URL: {url}")
         except Exception as e:
             print(f"Error processing URL {url}: {e}")
@@ -82,7 +100,7 @@ class DataLoader:
             }
         )
         
-        self.search_system.store_content(web_content)
+        self._store(web_content)
         print(f"Added note: {title}")
 
 # Example usage function
@@ -116,6 +134,7 @@ def add_example_data():
     ]
     for url in urls:
         loader.add_web_url(url)
+    loader.close()
 
 if __name__ == "__main__":
     # You can either run example_data() or create your own loading script
@@ -141,4 +160,5 @@ if __name__ == "__main__":
     )
     
     # Add current directory's python files
-    loader.add_directory('.', extensions=['.py'])
\ No newline at end of file
+    loader.add_directory('.', extensions=['.py'])
+    loader.close()
\ No newline at end of file
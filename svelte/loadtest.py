@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+WORDS = (
+    "svelte component store runes props effect derived state routing layout server load "
+    "form action hook adapter deploy build vite typescript python database index query "
+    "search vector embedding summary cache latency throughput request response stream "
+    "tailwind css grid flex color spacing animation transition accessibility testing"
+).split()
+
+# Endpoint name -> (method, path)
+ENDPOINTS = {
+    'search': ('POST', '/search'),
+    'static': ('GET', '/'),
+    'stats': ('GET', '/stats'),
+    'suggest': ('GET', '/suggest'),
+}
+
+
+@dataclass
+class EndpointResult:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    bytes_received: int = 0
+
+
+def build_fixture(db_path: str, docs: int, encoder_name: str, seed: int = 0):
+    """Fill a knowledge base with deterministic synthetic documents"""
+    from encoders import get_encoder
+    from scraper import AISearchSystem, WebContent
+
+    rng = random.Random(seed)
+    system = AISearchSystem(db_path, encoder=get_encoder(encoder_name))
+    start = datetime(2024, 1, 1)
+    for i in range(docs):
+        sentences = [
+            ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + '.'
+            for _ in range(rng.randint(10, 30))
+        ]
+        system.store_content(WebContent(
+            url=f"https://site{i % 5}.example/doc/{i}",
+            content=' '.join(sentences),
+            timestamp=start + timedelta(hours=i),
+            metadata={
+                'title': ' '.join(rng.choice(WORDS) for _ in range(4)).title(),
+                'tags': rng.sample(['article', 'docs', 'blog', 'reference'], 2)
+            }
+        ))
+    print(f"Built fixture with {docs} documents at {db_path}")
+
+
+def load_queries(path: Optional[str], count: int, seed: int = 0) -> List[Dict]:
+    """Queries from a log (plain lines or JSON lines with search fields), or a synthetic mix"""
+    if path:
+        queries, skipped = [], 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line) if line.startswith('{') else {'query': line}
+                except ValueError:
+                    entry = None
+                # Every request needs a non-empty query string, suggest prefixes included
+                if not isinstance(entry, dict) or not isinstance(entry.get('query'), str) or not entry['query'].strip():
+                    skipped += 1
+                    continue
+                queries.append(entry)
+        if skipped:
+            print(f"Skipped {skipped} lines of {path} without a usable query")
+        if not queries:
+            raise ValueError(f"No usable queries in {path}")
+        return queries
+
+    # Mostly short keyword queries, some longer questions, a few filtered ones
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.6:
+            queries.append({'query': ' '.join(rng.sample(WORDS, rng.randint(1, 3)))})
+        elif roll < 0.9:
+            queries.append({'query': 'how do I ' + ' '.join(rng.sample(WORDS, rng.randint(4, 8)))})
+        else:
+            queries.append({'query': ' '.join(rng.sample(WORDS, 2)), 'tags': [rng.choice(['article', 'docs'])]})
+    return queries
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    """'search=80,static=15,stats=5' -> [('search', 80.0), ...]"""
+    weights = []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+async def send_request(host: str, port: int, method: str, path: str, body: bytes = b'') -> Tuple[int, int]:
+    """Minimal HTTP/1.0 client; returns (status, response bytes)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = (
+            f"{method} {path} HTTP/1.0\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Accept-Encoding: gzip\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        writer.write(head.encode('ascii') + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status_line = response.split(b'\r\n', 1)[0].split()
+    status = int(status_line[1]) if len(status_line) > 1 else 0
+    return status, len(response)
+
+
+class LoadTest:
+    def __init__(self, host: str, port: int, queries: List[Dict], mix: List[Tuple[str, float]],
+                 timeout: float = 30.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.queries = queries
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.results: Dict[str, EndpointResult] = {name: EndpointResult() for name in self.names}
+
+    def _next_request(self) -> Tuple[str, str, bytes]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        path = ENDPOINTS[name][1]
+        body = b''
+        if name == 'search':
+            payload = dict(self.rng.choice(self.queries))
+            payload.setdefault('format', 'compact')
+            body = json.dumps(payload).encode('utf-8')
+        elif name == 'suggest':
+            # What the UI sends mid-keystroke: a prefix of some query
+            query = self.rng.choice(self.queries)['query']
+            path += '?' + urlencode({'q': query[:self.rng.randint(1, len(query))]})
+        return name, path, body
+
+    async def _one(self, name: str, path: str, body: bytes, started: float):
+        """Issue one request; latency counts from `started` so queueing delay is included"""
+        method = ENDPOINTS[name][0]
+        result = self.results[name]
+        try:
+            status, size = await asyncio.wait_for(
+                send_request(self.host, self.port, method, path, body), self.timeout
+            )
+            result.bytes_received += size
+            if status != 200:
+                result.errors += 1
+                return
+        except (OSError, asyncio.TimeoutError):
+            result.errors += 1
+            return
+        result.latencies.append(time.perf_counter() - started)
+
+    async def run_closed(self, concurrency: int, duration: float, max_requests: int = None):
+        """`concurrency` clients each send their next request as soon as the previous one returns"""
+        deadline = time.perf_counter() + duration
+        sent = 0
+
+        async def client():
+            nonlocal sent
+            while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+                sent += 1
+                name, path, body = self._next_request()
+                await self._one(name, path, body, time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def run_open(self, rate: float, duration: float, max_in_flight: int = 1000):
+        """Start requests on a fixed schedule, whether or not earlier ones have finished
+
+        Latency is measured from the scheduled start, so a server that falls
+        behind shows it in the percentiles instead of silently slowing the
+        generator down.
+        """
+        start = time.perf_counter()
+        in_flight = set()
+        i = 0
+        while True:
+            scheduled = start + i / rate
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name, path, body = self._next_request()
+            if len(in_flight) >= max_in_flight:
+                # Count as an error rather than letting the client become the bottleneck
+                self.results[name].errors += 1
+            else:
+                task = asyncio.ensure_future(self._one(name, path, body, scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            i += 1
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(result: EndpointResult, elapsed: float) -> Dict:
+    latencies = sorted(result.latencies)
+    total = len(latencies) + result.errors
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': total,
+        'ok': len(latencies),
+        'errors': result.errors,
+        'error_rate': round(result.errors / total, 4) if total else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'bytes_received': result.bytes_received,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'p999': ms(percentile(latencies, 99.9)),
+            'max': ms(latencies[-1]) if latencies else 0.0,
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, encoder_name: str, port: int, threaded: bool) -> subprocess.Popen:
+    """Run main.py against the fixture in a separate process and wait until it accepts connections"""
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'),
+        '--port', str(port), '--db', db_path, '--encoder', encoder_name, '--no-load', '--quiet'
+    ]
+    if threaded:
+        command.append('--threaded')
+    process = subprocess.Popen(command)
+
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 120 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the search server")
+    target = parser.add_argument_group('target')
+    target.add_argument('--url', default=None, help="Test an already running server instead of starting one")
+    target.add_argument('--db', default=None, help="Knowledge base to copy as the fixture (default: synthetic)")
+    target.add_argument('--docs', type=int, default=200, help="Synthetic fixture size")
+    target.add_argument('--stub-encoder', action='store_true',
+                        help="Use the hashing encoder so no model has to be loaded")
+    target.add_argument('--threaded', action='store_true', help="Start the server with --threaded")
+
+    load = parser.add_argument_group('load')
+    load.add_argument('--concurrency', type=int, default=16, help="Closed-loop clients")
+    load.add_argument('--rate', type=float, default=None, help="Open-loop requests per second (overrides --concurrency)")
+    load.add_argument('--duration', type=float, default=30.0, help="Seconds to run")
+    load.add_argument('--requests', type=int, default=None, help="Stop closed-loop runs after this many requests")
+    load.add_argument('--queries', default=None, help="Query log: one query per line, or JSON lines")
+    load.add_argument('--mix', default='search=80,static=15,stats=5', help="Endpoint weights, e.g. search=40,suggest=50,static=10")
+    load.add_argument('--timeout', type=float, default=30.0)
+    load.add_argument('--seed', type=int, default=0)
+
+    parser.add_argument('--output', default='loadtest_results.json', help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    encoder_name = 'hashing' if args.stub_encoder else os.environ.get('SEARCH_ENCODER', 'auto')
+    workdir = None
+    server = None
+    try:
+        if args.url:
+            parsed = urlparse(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+        else:
+            workdir = tempfile.mkdtemp(prefix='loadtest-')
+            db_path = os.path.join(workdir, 'knowledge_base.db')
+            if args.db:
+                shutil.copyfile(args.db, db_path)
+                from encoders import get_encoder
+                from scraper import AISearchSystem
+                # Bring a copied store in line with the chosen encoder before timing anything
+                AISearchSystem(db_path, encoder=get_encoder(encoder_name), reembed=True)
+            else:
+                build_fixture(db_path, args.docs, encoder_name, args.seed)
+            host, port = '127.0.0.1', _free_port()
+            server = start_server(db_path, encoder_name, port, args.threaded)
+
+        test = LoadTest(host, port, load_queries(args.queries, 500, args.seed), parse_mix(args.mix),
+                        timeout=args.timeout, seed=args.seed)
+        mode = f"open loop at {args.rate} req/s" if args.rate else f"closed loop with {args.concurrency} clients"
+        print(f"Running {mode} for {args.duration}s against {host}:{port}")
+
+        started = time.perf_counter()
+        if args.rate:
+            asyncio.run(test.run_open(args.rate, args.duration))
+        else:
+            asyncio.run(test.run_closed(args.concurrency, args.duration, args.requests))
+        elapsed = time.perf_counter() - started
+
+        overall = EndpointResult()
+        for result in test.results.values():
+            overall.latencies += result.latencies
+            overall.errors += result.errors
+            overall.bytes_received += result.bytes_received
+
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'config': {
+                'target': f"{host}:{port}",
+                'mode': 'open' if args.rate else 'closed',
+                'rate': args.rate,
+                'concurrency': None if args.rate else args.concurrency,
+                'duration': args.duration,
+                'mix': dict(parse_mix(args.mix)),
+                'encoder': encoder_name,
+                'threaded_server': args.threaded,
+                'fixture': args.db or (None if args.url else f"synthetic:{args.docs}"),
+            },
+            'elapsed_seconds': round(elapsed, 3),
+            'overall': summarize(overall, elapsed),
+            'endpoints': {name: summarize(result, elapsed) for name, result in test.results.items()},
+        }
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        o = report['overall']
+        print(f"{o['ok']} ok, {o['errors']} errors ({o['error_rate']:.2%}), {o['throughput_rps']} req/s")
+        for name, summary in [('overall', o)] + list(report['endpoints'].items()):
+            lat = summary['latency_ms']
+            print(f"  {name:8} p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms p999={lat['p999']}ms")
+        print(f"Report written to {args.output}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,42 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import HTTPServer, ThreadingHTTPServer, SimpleHTTPRequestHandler
 import json
 import os
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 import sqlite3
+from typing import List, Dict, Optional
+from pipeline import IngestPipeline, IngestItem
+from scraper import AISearchSystem, WebContent
+from shards import ShardedSearchSystem
+from encoders import get_encoder
+from ingest import ParallelIngestor
+from profiling import SlowQueryLog, Profiler
+from snapshots import SnapshotManager, SnapshotError
+import argparse
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+import gzip
+import hashlib
+import hmac
+import mimetypes
+from dataclasses import dataclass
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-class WebContent:
-    def __init__(self, url, content, timestamp, metadata=None):
-        self.url = url
-        self.content = content
-        self.timestamp = timestamp
-        self.metadata = metadata or {}
-
-class AISearchSystem:
-    def __init__(self):
-        self.content_store = []
-        
-    def store_content(self, web_content):
-        """Store WebContent object in the system"""
-        self.content_store.append(web_content)
-        
-    from http.server import HTTPServer, SimpleHTTPRequestHandler
-import json
-import os
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-import sqlite3
-from typing import List, Dict
-
-class WebContent:
-    def __init__(self, url, content, timestamp, metadata=None):
-        self.url = url
-        self.content = content
-        self.timestamp = timestamp
-        self.metadata = metadata or {}
-
-class AISearchSystem:
-    def __init__(self):
-        self.content_store = []
-        
-    def store_content(self, web_content):
-        """Store WebContent object in the system"""
-        self.content_store.append(web_content)
-        
-    def semantic_search(self, query: str) -> Dict:
-        """Enhanced search implementation with structured response"""
-        results = []
-        query_terms = query.lower().split()
-        
-        for content in self.content_store:
-            score = 0
-            content_text = content.content.lower()
-            
-            # Simple scoring based on term frequency
-            for term in query_terms:
-                score += content_text.count(term)
-                
-            if score > 0:
-                # Calculate similarity score (normalized between 0 and 1)
-                max_possible_score = len(query_terms) * (len(content_text.split()) / 10)  # rough estimation
-                similarity = min(score / max_possible_score, 1.0) if max_possible_score > 0 else 0
-                
-                # Create summary (first 200 chars)
-                summary = content.content[:200].strip() + "..."
-                
-                # Extract key points (simple implementation)
-                sentences = content.content.split('.')
-                key_points = [s.strip() for s in sentences[:3] if len(s.strip()) > 20]
-                
-                results.append({
-                    'url': content.url,
-                    'title': content.metadata.get('title', content.url),
-                    'similarity': similarity,
-                    'summary': summary,
-                    'key_points': key_points,
-                    'chunk': content.content[:200] + '...'  # Fallback content
-                })
-        
-        # Sort results by similarity score
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        # Generate overall summary
-        overall_summary = "Found {} relevant results. ".format(len(results))
-        if results:
-            overall_summary += "Most relevant content from {} and other sources.".format(
-                results[0]['title']
-            )
-        
-        return {
-            'results': results,
-            'overall_summary': overall_summary
-        }
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+# Host headers admin requests may carry when no admin token is configured
+LOCAL_HOSTNAMES = ('localhost', '127.0.0.1', '[::1]')
 
 class DataLoader:
-    def __init__(self, search_system):
+    def __init__(self, search_system, parallel_workers: int = 0):
         self.search_system = search_system
+        # > 0 hands embedding to a process pool behind a single SQLite writer
+        self.parallel_workers = parallel_workers
         self.db_path = "url_cache.db"
         self._init_cache_db()
         
@@ -128,6 +68,39 @@ class DataLoader:
                 (url, datetime.now(), success)
             )
         
+    def fetch_page(self, url: str) -> str:
+        """Download the raw HTML for a URL"""
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+        return response.text
+        
+    def extract_content(self, url: str, html: str) -> WebContent:
+        """Turn downloaded HTML into a WebContent object"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+        
+        # Get title
+        title = soup.title.string if soup.title else url
+        
+        # Extract text and clean it up
+        text = ' '.join(soup.stripped_strings)
+        
+        return WebContent(
+            url=url,
+            content=text,
+            timestamp=datetime.now(),
+            metadata={
+                'title': title,
+                'tags': ['webpage']
+            }
+        )
+        
     def scrape_and_store_url(self, url: str, force_refresh: bool = False):
         """Scrape content from a URL and store it in the search system"""
         # Skip if already scraped and not forcing refresh
@@ -136,33 +109,7 @@ class DataLoader:
             return None
             
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get title
-            title = soup.title.string if soup.title else url
-            
-            # Extract text and clean it up
-            text = ' '.join(soup.stripped_strings)
-            
-            web_content = WebContent(
-                url=url,
-                content=text,
-                timestamp=datetime.now(),
-                metadata={
-                    'title': title,
-                    'tags': ['webpage']
-                }
-            )
+            web_content = self.extract_content(url, self.fetch_page(url))
             
             # Store the content in the search system
             self.search_system.store_content(web_content)
@@ -179,8 +126,66 @@ class DataLoader:
             self.mark_url_scraped(url, success=False)
             return None
             
-    def load_initial_data(self, force_refresh: bool = False):
-        """Load initial data into the search system"""
+    def build_pipeline(self, force_refresh: bool = False, fetch_workers: int = 8,
+                       extract_workers: int = 2, embed_workers: int = 2,
+                       queue_size: int = 32) -> IngestPipeline:
+        """Create a fetch/extract/embed/store pipeline that feeds this loader's search system"""
+        def fetch(item: IngestItem) -> IngestItem:
+            item.html = self.fetch_page(item.url)
+            return item
+        
+        def extract(item: IngestItem) -> IngestItem:
+            item.content = self.extract_content(item.url, item.html)
+            item.html = None  # Don't hold raw HTML in the store queue
+            return item
+        
+        ingestor = None
+        if self.parallel_workers:
+            ingestor = ParallelIngestor(
+                self.search_system,
+                workers=self.parallel_workers,
+                on_stored=lambda url: self.mark_url_scraped(url, success=True),
+                on_failed=lambda url, error: self.mark_url_scraped(url, success=False)
+            )
+        
+        def embed(item: IngestItem) -> IngestItem:
+            # With a ParallelIngestor the process pool does the embedding instead
+            if not ingestor:
+                with self.search_system.profiler.maybe_profile('ingest', item.url):
+                    item.prepared = self.search_system.prepare_content(item.content)
+            return item
+        
+        def store(item: IngestItem):
+            if ingestor:
+                ingestor.submit(item.content)
+                return
+            self.search_system.store_prepared(item.prepared)
+            self.mark_url_scraped(item.url, success=True)
+        
+        def on_error(stage: str, item: IngestItem, error: Exception):
+            print(f"Error in {stage} stage for {item.url}: {error}")
+            self.mark_url_scraped(item.url, success=False)
+        
+        return IngestPipeline(
+            fetch=fetch,
+            extract=extract,
+            embed=embed,
+            store=store,
+            should_skip=None if force_refresh else self.is_url_scraped,
+            on_error=on_error,
+            on_done=ingestor.close if ingestor else None,
+            fetch_workers=fetch_workers,
+            extract_workers=extract_workers,
+            embed_workers=embed_workers,
+            queue_size=queue_size
+        )
+        
+    def load_initial_data(self, force_refresh: bool = False, background: bool = False) -> IngestPipeline:
+        """Load initial data into the search system
+        
+        URLs go through an IngestPipeline; with background=True this returns as
+        soon as the pipeline has started instead of waiting for it to drain.
+        """
         # Add some sample content
         sample_content = WebContent(
             url="local://sample",
@@ -226,11 +231,158 @@ class DataLoader:
             "https://svelte.dev/","https://svelte.dev/#main","https://svelte.dev/blog","https://svelte.dev/chat","https://svelte.dev/docs","https://svelte.dev/docs#main","https://svelte.dev/docs/cli","https://svelte.dev/docs/cli/","https://svelte.dev/docs/cli/#Acknowledgements","https://svelte.dev/docs/cli/#Usage","https://svelte.dev/docs/cli/#main","https://svelte.dev/docs/cli/overview","https://svelte.dev/docs/cli/sv-add","https://svelte.dev/docs/cli/sv-check","https://svelte.dev/docs/cli/sv-create","https://svelte.dev/docs/cli/sv-migrate","https://svelte.dev/docs/kit","https://svelte.dev/docs/kit#main","https://svelte.dev/docs/kit/","https://svelte.dev/docs/kit/#Before-we-begin","https://svelte.dev/docs/kit/#SvelteKit-vs-Svelte","https://svelte.dev/docs/kit/#What-is-Svelte","https://svelte.dev/docs/kit/#What-is-SvelteKit","https://svelte.dev/docs/kit/#main","https://svelte.dev/docs/kit/$app-environment","https://svelte.dev/docs/kit/$app-forms","https://svelte.dev/docs/kit/$app-navigation","https://svelte.dev/docs/kit/$app-paths","https://svelte.dev/docs/kit/$app-server","https://svelte.dev/docs/kit/$app-stores","https://svelte.dev/docs/kit/$env-dynamic-private","https://svelte.dev/docs/kit/$env-dynamic-public","https://svelte.dev/docs/kit/$env-static-private","https://svelte.dev/docs/kit/$env-static-public","https://svelte.dev/docs/kit/$lib","https://svelte.dev/docs/kit/$service-worker","https://svelte.dev/docs/kit/@sveltejs-kit","https://svelte.dev/docs/kit/@sveltejs-kit-hooks","https://svelte.dev/docs/kit/@sveltejs-kit-node","https://svelte.dev/docs/kit/@sveltejs-kit-node-polyfills","https://svelte.dev/docs/kit/@sveltejs-kit-vite","https://svelte.dev/docs/kit/accessibility","https://svelte.dev/docs/kit/adapter-auto","https://svelte.dev/docs/kit/adapter-cloudflare","https://svelte.dev/docs/kit/adapter-cloudflare-workers","https://svelte.dev/docs/kit/adapter-netlify","https://svelte.dev/docs/kit/adapter-node","https://svelte.dev/docs/kit/adapter-static","https://svelte.dev/docs/kit/adapter-vercel","https://svelte.dev/docs/kit/adapters","https://svelte.dev/docs/kit/additional-resources","https://svelte.dev/docs/kit/advanced-routing","https://svelte.dev/docs/kit/auth","https://svelte.dev/docs/kit/building-your-app","https://svelte.dev/docs/kit/cli","https://svelte.dev/docs/kit/configuration","https://svelte.dev/docs/kit/creating-a-project","https://svelte.dev/docs/kit/debugging","https://svelte.dev/docs/kit/errors","https://svelte.dev/docs/kit/faq","https://svelte.dev/docs/kit/faq#What-can-I-make-with-SvelteKit","https://svelte.dev/docs/kit/form-actions","https://svelte.dev/docs/kit/glossary","https://svelte.dev/docs/kit/glossary#CSR","https://svelte.dev/docs/kit/glossary#Prerendering","https://svelte.dev/docs/kit/glossary#Routing","https://svelte.dev/docs/kit/glossary#SSR","https://svelte.dev/docs/kit/hooks","https://svelte.dev/docs/kit/images","https://svelte.dev/docs/kit/integrations","https://svelte.dev/docs/kit/introduction","https://svelte.dev/docs/kit/link-options","https://svelte.dev/docs/kit/link-options#data-sveltekit-preload-data","https://svelte.dev/docs/kit/load","https://svelte.dev/docs/kit/migrating","https://svelte.dev/docs/kit/migrating-to-sveltekit-2","https://svelte.dev/docs/kit/packaging","https://svelte.dev/docs/kit/page-options","https://svelte.dev/docs/kit/performance","https://svelte.dev/docs/kit/project-structure","https://svelte.dev/docs/kit/routing","https://svelte.dev/docs/kit/seo","https://svelte.dev/docs/kit/server-only-modules","https://svelte.dev/docs/kit/service-workers","https://svelte.dev/docs/kit/shallow-routing","https://svelte.dev/docs/kit/single-page-apps","https://svelte.dev/docs/kit/snapshots","https://svelte.dev/docs/kit/state-management","https://svelte.dev/docs/kit/types","https://svelte.dev/docs/kit/web-standards","https://svelte.dev/docs/kit/writing-adapters","https://svelte.dev/docs/svelte","https://svelte.dev/docs/svelte#main","https://svelte.dev/docs/svelte/$bindable","https://svelte.dev/docs/svelte/$derived","https://svelte.dev/docs/svelte/$effect","https://svelte.dev/docs/svelte/$host","https://svelte.dev/docs/svelte/$inspect","https://svelte.dev/docs/svelte/$props","https://svelte.dev/docs/svelte/$state","https://svelte.dev/docs/svelte/@const","https://svelte.dev/docs/svelte/@debug","https://svelte.dev/docs/svelte/@html","https://svelte.dev/docs/svelte/@render","https://svelte.dev/docs/svelte/animate","https://svelte.dev/docs/svelte/await","https://svelte.dev/docs/svelte/basic-markup","https://svelte.dev/docs/svelte/bind","https://svelte.dev/docs/svelte/class","https://svelte.dev/docs/svelte/compiler-errors","https://svelte.dev/docs/svelte/compiler-warnings","https://svelte.dev/docs/svelte/context","https://svelte.dev/docs/svelte/custom-elements","https://svelte.dev/docs/svelte/custom-properties","https://svelte.dev/docs/svelte/each","https://svelte.dev/docs/svelte/faq","https://svelte.dev/docs/svelte/getting-started","https://svelte.dev/docs/svelte/global-styles","https://svelte.dev/docs/svelte/if","https://svelte.dev/docs/svelte/imperative-component-api","https://svelte.dev/docs/svelte/in-and-out","https://svelte.dev/docs/svelte/key","https://svelte.dev/docs/svelte/legacy-$$props-and-$$restProps","https://svelte.dev/docs/svelte/legacy-$$slots","https://svelte.dev/docs/svelte/legacy-component-api","https://svelte.dev/docs/svelte/legacy-export-let","https://svelte.dev/docs/svelte/legacy-let","https://svelte.dev/docs/svelte/legacy-on","https://svelte.dev/docs/svelte/legacy-overview","https://svelte.dev/docs/svelte/legacy-reactive-assignments","https://svelte.dev/docs/svelte/legacy-slots","https://svelte.dev/docs/svelte/legacy-svelte-component","https://svelte.dev/docs/svelte/legacy-svelte-fragment","https://svelte.dev/docs/svelte/legacy-svelte-self","https://svelte.dev/docs/svelte/lifecycle-hooks","https://svelte.dev/docs/svelte/nested-style-elements","https://svelte.dev/docs/svelte/overview","https://svelte.dev/docs/svelte/runtime-errors","https://svelte.dev/docs/svelte/runtime-warnings","https://svelte.dev/docs/svelte/scoped-styles","https://svelte.dev/docs/svelte/snippet","https://svelte.dev/docs/svelte/stores","https://svelte.dev/docs/svelte/style","https://svelte.dev/docs/svelte/svelte","https://svelte.dev/docs/svelte/svelte-action","https://svelte.dev/docs/svelte/svelte-animate","https://svelte.dev/docs/svelte/svelte-body","https://svelte.dev/docs/svelte/svelte-compiler","https://svelte.dev/docs/svelte/svelte-document","https://svelte.dev/docs/svelte/svelte-easing","https://svelte.dev/docs/svelte/svelte-element","https://svelte.dev/docs/svelte/svelte-events","https://svelte.dev/docs/svelte/svelte-files","https://svelte.dev/docs/svelte/svelte-head","https://svelte.dev/docs/svelte/svelte-js-files","https://svelte.dev/docs/svelte/svelte-legacy","https://svelte.dev/docs/svelte/svelte-motion","https://svelte.dev/docs/svelte/svelte-options","https://svelte.dev/docs/svelte/svelte-reactivity","https://svelte.dev/docs/svelte/svelte-server","https://svelte.dev/docs/svelte/svelte-store","https://svelte.dev/docs/svelte/svelte-transition","https://svelte.dev/docs/svelte/svelte-window","https://svelte.dev/docs/svelte/testing","https://svelte.dev/docs/svelte/transition","https://svelte.dev/docs/svelte/typescript","https://svelte.dev/docs/svelte/use","https://svelte.dev/docs/svelte/v4-migration-guide","https://svelte.dev/docs/svelte/v5-migration-guide","https://svelte.dev/docs/svelte/what-are-runes","https://svelte.dev/kit","https://svelte.dev/playground","https://svelte.dev/tutorial","https://svelte.dev/tutorial/kit","https://tailwindcss.com/","https://tailwindcss.com/blog","https://tailwindcss.com/blog/2024-05-24-catalyst-application-layouts","https://tailwindcss.com/docs","https://tailwindcss.com/docs/adding-custom-styles","https://tailwindcss.com/docs/align-content","https://tailwindcss.com/docs/align-items","https://tailwindcss.com/docs/align-self","https://tailwindcss.com/docs/aspect-ratio","https://tailwindcss.com/docs/box-decoration-break","https://tailwindcss.com/docs/box-sizing","https://tailwindcss.com/docs/break-after","https://tailwindcss.com/docs/break-before","https://tailwindcss.com/docs/break-inside","https://tailwindcss.com/docs/browser-support","https://tailwindcss.com/docs/clear","https://tailwindcss.com/docs/columns","https://tailwindcss.com/docs/configuration","https://tailwindcss.com/docs/container","https://tailwindcss.com/docs/content-configuration","https://tailwindcss.com/docs/customizing-colors","https://tailwindcss.com/docs/customizing-spacing","https://tailwindcss.com/docs/dark-mode","https://tailwindcss.com/docs/display","https://tailwindcss.com/docs/editor-setup","https://tailwindcss.com/docs/flex","https://tailwindcss.com/docs/flex-basis","https://tailwindcss.com/docs/flex-direction","https://tailwindcss.com/docs/flex-grow","https://tailwindcss.com/docs/flex-shrink","https://tailwindcss.com/docs/flex-wrap","https://tailwindcss.com/docs/float","https://tailwindcss.com/docs/font-family","https://tailwindcss.com/docs/font-size","https://tailwindcss.com/docs/font-smoothing","https://tailwindcss.com/docs/font-style","https://tailwindcss.com/docs/font-variant-numeric","https://tailwindcss.com/docs/font-weight","https://tailwindcss.com/docs/functions-and-directives","https://tailwindcss.com/docs/gap","https://tailwindcss.com/docs/grid-auto-columns","https://tailwindcss.com/docs/grid-auto-flow","https://tailwindcss.com/docs/grid-auto-rows","https://tailwindcss.com/docs/grid-column","https://tailwindcss.com/docs/grid-row","https://tailwindcss.com/docs/grid-template-columns","https://tailwindcss.com/docs/grid-template-rows","https://tailwindcss.com/docs/height","https://tailwindcss.com/docs/hover-focus-and-other-states","https://tailwindcss.com/docs/installation","https://tailwindcss.com/docs/isolation","https://tailwindcss.com/docs/justify-content","https://tailwindcss.com/docs/justify-items","https://tailwindcss.com/docs/justify-self","https://tailwindcss.com/docs/letter-spacing","https://tailwindcss.com/docs/line-clamp","https://tailwindcss.com/docs/line-height","https://tailwindcss.com/docs/list-style-image","https://tailwindcss.com/docs/list-style-position","https://tailwindcss.com/docs/list-style-type","https://tailwindcss.com/docs/margin","https://tailwindcss.com/docs/max-height","https://tailwindcss.com/docs/max-width","https://tailwindcss.com/docs/min-height","https://tailwindcss.com/docs/min-width","https://tailwindcss.com/docs/object-fit","https://tailwindcss.com/docs/object-position","https://tailwindcss.com/docs/optimizing-for-production","https://tailwindcss.com/docs/order","https://tailwindcss.com/docs/overflow","https://tailwindcss.com/docs/overscroll-behavior","https://tailwindcss.com/docs/padding","https://tailwindcss.com/docs/place-content","https://tailwindcss.com/docs/place-items","https://tailwindcss.com/docs/place-self","https://tailwindcss.com/docs/plugins","https://tailwindcss.com/docs/position","https://tailwindcss.com/docs/preflight","https://tailwindcss.com/docs/presets","https://tailwindcss.com/docs/responsive-design","https://tailwindcss.com/docs/reusing-styles","https://tailwindcss.com/docs/screens","https://tailwindcss.com/docs/size","https://tailwindcss.com/docs/space","https://tailwindcss.com/docs/text-align","https://tailwindcss.com/docs/text-color","https://tailwindcss.com/docs/text-decoration","https://tailwindcss.com/docs/text-decoration-color","https://tailwindcss.com/docs/text-decoration-style","https://tailwindcss.com/docs/text-decoration-thickness","https://tailwindcss.com/docs/theme","https://tailwindcss.com/docs/top-right-bottom-left","https://tailwindcss.com/docs/upgrade-guide","https://tailwindcss.com/docs/using-with-preprocessors","https://tailwindcss.com/docs/utility-first","https://tailwindcss.com/docs/visibility","https://tailwindcss.com/docs/width","https://tailwindcss.com/docs/z-index","https://tailwindcss.com/resources","https://tailwindcss.com/showcase","https://www.typescriptlang.org/","https://www.typescriptlang.org/#","https://www.typescriptlang.org/#m-stories","https://www.typescriptlang.org/#site-content","https://www.typescriptlang.org/assets/typescript-cheat-sheets.zip","https://www.typescriptlang.org/branding/","https://www.typescriptlang.org/cheatsheets/","https://www.typescriptlang.org/community","https://www.typescriptlang.org/community/","https://www.typescriptlang.org/docs/","https://www.typescriptlang.org/docs/#site-content","https://www.typescriptlang.org/docs/handbook/2/basic-types.html","https://www.typescriptlang.org/docs/handbook/2/classes.html","https://www.typescriptlang.org/docs/handbook/2/conditional-types.html","https://www.typescriptlang.org/docs/handbook/2/everyday-types.html","https://www.typescriptlang.org/docs/handbook/2/functions.html","https://www.typescriptlang.org/docs/handbook/2/generics.html","https://www.typescriptlang.org/docs/handbook/2/indexed-access-types.html","https://www.typescriptlang.org/docs/handbook/2/keyof-types.html","https://www.typescriptlang.org/docs/handbook/2/mapped-types.html","https://www.typescriptlang.org/docs/handbook/2/modules.html","https://www.typescriptlang.org/docs/handbook/2/narrowing.html","https://www.typescriptlang.org/docs/handbook/2/objects.html","https://www.typescriptlang.org/docs/handbook/2/template-literal-types.html","https://www.typescriptlang.org/docs/handbook/2/typeof-types.html","https://www.typescriptlang.org/docs/handbook/2/types-from-types.html","https://www.typescriptlang.org/docs/handbook/asp-net-core.html","https://www.typescriptlang.org/docs/handbook/babel-with-typescript.html","https://www.typescriptlang.org/docs/handbook/compiler-options-in-msbuild.html","https://www.typescriptlang.org/docs/handbook/compiler-options.html","https://www.typescriptlang.org/docs/handbook/configuring-watch.html","https://www.typescriptlang.org/docs/handbook/declaration-files/by-example.html","https://www.typescriptlang.org/docs/handbook/declaration-files/consumption.html","https://www.typescriptlang.org/docs/handbook/declaration-files/deep-dive.html","https://www.typescriptlang.org/docs/handbook/declaration-files/do-s-and-don-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/dts-from-js.html","https://www.typescriptlang.org/docs/handbook/declaration-files/introduction.html","https://www.typescriptlang.org/docs/handbook/declaration-files/library-structures.html","https://www.typescriptlang.org/docs/handbook/declaration-files/publishing.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/global-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/global-modifying-module-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/module-class-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/module-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/module-function-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-files/templates/module-plugin-d-ts.html","https://www.typescriptlang.org/docs/handbook/declaration-merging.html","https://www.typescriptlang.org/docs/handbook/decorators.html","https://www.typescriptlang.org/docs/handbook/dom-manipulation.html","https://www.typescriptlang.org/docs/handbook/enums.html","https://www.typescriptlang.org/docs/handbook/gulp.html","https://www.typescriptlang.org/docs/handbook/integrating-with-build-tools.html","https://www.typescriptlang.org/docs/handbook/intro-to-js-ts.html","https://www.typescriptlang.org/docs/handbook/intro.html","https://www.typescriptlang.org/docs/handbook/intro.html#handbook-content","https://www.typescriptlang.org/docs/handbook/iterators-and-generators.html","https://www.typescriptlang.org/docs/handbook/jsdoc-supported-types.html","https://www.typescriptlang.org/docs/handbook/jsx.html","https://www.typescriptlang.org/docs/handbook/migrating-from-javascript.html","https://www.typescriptlang.org/docs/handbook/mixins.html","https://www.typescriptlang.org/docs/handbook/modules/appendices/esm-cjs-interop.html","https://www.typescriptlang.org/docs/handbook/modules/guides/choosing-compiler-options.html","https://www.typescriptlang.org/docs/handbook/modules/introduction.html","https://www.typescriptlang.org/docs/handbook/modules/reference.html","https://www.typescriptlang.org/docs/handbook/modules/theory.html","https://www.typescriptlang.org/docs/handbook/namespaces-and-modules.html","https://www.typescriptlang.org/docs/handbook/namespaces.html","https://www.typescriptlang.org/docs/handbook/nightly-builds.html","https://www.typescriptlang.org/docs/handbook/project-references.html","https://www.typescriptlang.org/docs/handbook/react-&-webpack.html","https://www.typescriptlang.org/docs/handbook/release-notes/typescript-5-2.html","https://www.typescriptlang.org/docs/handbook/release-notes/typescript-5-3.html","https://www.typescriptlang.org/docs/handbook/release-notes/typescript-5-4.html","https://www.typescriptlang.org/docs/handbook/release-notes/typescript-5-5.html","https://www.typescriptlang.org/docs/handbook/symbols.html","https://www.typescriptlang.org/docs/handbook/triple-slash-directives.html","https://www.typescriptlang.org/docs/handbook/tsconfig-json.html","https://www.typescriptlang.org/docs/handbook/type-checking-javascript-files.html","https://www.typescriptlang.org/docs/handbook/type-compatibility.html","https://www.typescriptlang.org/docs/handbook/type-inference.html","https://www.typescriptlang.org/docs/handbook/typescript-from-scratch.html","https://www.typescriptlang.org/docs/handbook/typescript-in-5-minutes-func.html","https://www.typescriptlang.org/docs/handbook/typescript-in-5-minutes-oop.html","https://www.typescriptlang.org/docs/handbook/typescript-in-5-minutes.html","https://www.typescriptlang.org/docs/handbook/typescript-tooling-in-5-minutes.html","https://www.typescriptlang.org/docs/handbook/utility-types.html","https://www.typescriptlang.org/docs/handbook/variable-declarations.html","https://www.typescriptlang.org/download","https://www.typescriptlang.org/download/","https://www.typescriptlang.org/download/#site-content","https://www.typescriptlang.org/play","https://www.typescriptlang.org/play/","https://www.typescriptlang.org/play/#show-examples","https://www.typescriptlang.org/static/TypeScript%20Classes-83cc6f8e42ba2002d5e2c04221fa78f9.png","https://www.typescriptlang.org/static/TypeScript%20Control%20Flow%20Analysis-8a549253ad8470850b77c4c5c351d457.png","https://www.typescriptlang.org/static/TypeScript%20Interfaces-34f1ad12132fb463bd1dfe5b85c5b2e6.png","https://www.typescriptlang.org/static/TypeScript%20Types-ae199d69aeecf7d4a2704a528d0fd3f9.png","https://www.typescriptlang.org/tools/","https://www.typescriptlang.org/tsconfig/","https://www.typescriptlang.org/tsconfig/#isolatedModules","https://www.typescriptlang.org/why-create-typescript/","https://www.w3schools.com/","https://www.w3schools.com/academy/index.php","https://www.w3schools.com/academy/teachers/index.php","https://www.w3schools.com/accessibility/index.php","https://www.w3schools.com/ai/default.asp","https://www.w3schools.com/angular/angular_ref_directives.asp","https://www.w3schools.com/angular/default.asp","https://www.w3schools.com/appml/appml_reference.asp","https://www.w3schools.com/appml/default.asp","https://www.w3schools.com/asp/asp_ref_vbscript_functions.asp","https://www.w3schools.com/asp/default.asp","https://www.w3schools.com/aws/index.php","https://www.w3schools.com/bootstrap/bootstrap_ver.asp","https://www.w3schools.com/browsers/default.asp","https://www.w3schools.com/c/c_ref_reference.php","https://www.w3schools.com/c/index.php","https://www.w3schools.com/charsets/default.asp","https://www.w3schools.com/codegame/index.html","https://www.w3schools.com/colors/colors_fs595.asp","https://www.w3schools.com/colors/default.asp","https://www.w3schools.com/cpp/cpp_ref_reference.asp","https://www.w3schools.com/cpp/default.asp","https://www.w3schools.com/cs/index.php","https://www.w3schools.com/css","https://www.w3schools.com/css/css_rwd_intro.asp","https://www.w3schools.com/css/default.asp","https://www.w3schools.com/cssref/default.asp","https://www.w3schools.com/cybersecurity/index.php","https://www.w3schools.com/datascience/default.asp","https://www.w3schools.com/django/django_ref_template_tags.php","https://www.w3schools.com/django/index.php","https://www.w3schools.com/dsa/index.php","https://www.w3schools.com/excel/index.php","https://www.w3schools.com/gen_ai/bard/index.php","https://www.w3schools.com/gen_ai/chatgpt-3-5/index.php","https://www.w3schools.com/gen_ai/chatgpt-4/index.php","https://www.w3schools.com/gen_ai/index.php","https://www.w3schools.com/git/default.asp","https://www.w3schools.com/go/index.php","https://www.w3schools.com/googlesheets/index.php","https://www.w3schools.com/graphics/canvas_intro.asp","https://www.w3schools.com/graphics/canvas_reference.asp","https://www.w3schools.com/graphics/default.asp","https://www.w3schools.com/graphics/svg_intro.asp","https://www.w3schools.com/graphics/svg_reference.asp","https://www.w3schools.com/howto/default.asp","https://www.w3schools.com/html","https://www.w3schools.com/html/default.asp","https://www.w3schools.com/html/html_exercises.asp","https://www.w3schools.com/icons/default.asp","https://www.w3schools.com/icons/icons_reference.asp","https://www.w3schools.com/java/default.asp","https://www.w3schools.com/java/java_ref_reference.asp","https://www.w3schools.com/jquery/default.asp","https://www.w3schools.com/jquery/jquery_ref_overview.asp","https://www.w3schools.com/js/","https://www.w3schools.com/js/default.asp","https://www.w3schools.com/js/js_ajax_intro.asp","https://www.w3schools.com/js/js_json_intro.asp","https://www.w3schools.com/jsref/default.asp","https://www.w3schools.com/jsref/jsref_obj_json.asp","https://www.w3schools.com/kotlin/index.php","https://www.w3schools.com/mongodb/index.php","https://www.w3schools.com/mysql/default.asp","https://www.w3schools.com/mysql/mysql_datatypes.asp","https://www.w3schools.com/nodejs/default.asp","https://www.w3schools.com/nodejs/nodejs_raspberrypi.asp","https://www.w3schools.com/nodejs/ref_modules.asp","https://www.w3schools.com/php/default.asp","https://www.w3schools.com/php/php_ref_overview.asp","https://www.w3schools.com/plus/index.php","https://www.w3schools.com/postgresql/index.php","https://www.w3schools.com/python/default.asp","https://www.w3schools.com/python/matplotlib_intro.asp","https://www.w3schools.com/python/numpy/default.asp","https://www.w3schools.com/python/pandas/default.asp","https://www.w3schools.com/python/python_ml_getting_started.asp","https://www.w3schools.com/python/python_reference.asp","https://www.w3schools.com/python/scipy/index.php","https://www.w3schools.com/r/default.asp","https://www.w3schools.com/react/default.asp","https://www.w3schools.com/sass/default.php","https://www.w3schools.com/sass/sass_functions_string.php","https://www.w3schools.com/spaces/index.php","https://www.w3schools.com/sql","https://www.w3schools.com/sql/default.asp","https://www.w3schools.com/sql/sql_ref_keywords.asp","https://www.w3schools.com/statistics/index.php","https://www.w3schools.com/tags/default.asp","https://www.w3schools.com/tryit/default.asp","https://www.w3schools.com/typescript","https://www.w3schools.com/typescript/index.php","https://www.w3schools.com/typingspeed/default.asp","https://www.w3schools.com/vue/index.php","https://www.w3schools.com/vue/vue_ref_builtin-attributes.php","https://www.w3schools.com/w3css/default.asp","https://www.w3schools.com/w3css/w3css_references.asp","https://www.w3schools.com/w3css/w3css_templates.asp","https://www.w3schools.com/w3js/default.asp","https://www.w3schools.com/w3js/w3js_references.asp","https://www.w3schools.com/whatis/default.asp","https://www.w3schools.com/where_to_start.asp","https://www.w3schools.com/xml/default.asp","https://www.w3schools.com/xml/dom_nodetype.asp"
         ]
         
-        for url in urls:
-            self.scrape_and_store_url(url, force_refresh=force_refresh)
+        pipeline = self.build_pipeline(force_refresh=force_refresh)
+        pipeline.start(urls)
+        pipeline.report_progress()
+        if not background:
+            pipeline.join()
+        return pipeline
+
+@dataclass
+class StaticAsset:
+    content_type: str
+    etag: str
+    body: bytes
+    gzip_body: bytes
+    br_body: Optional[bytes] = None
+
+class StaticAssetCache:
+    """Files under a directory, held in memory and precompressed once at startup"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets: Dict[str, StaticAsset] = {}
+        self.load()
+        
+    def load(self):
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    body = f.read()
+                url_path = '/' + os.path.relpath(path, self.directory).replace(os.sep, '/')
+                assets[url_path] = StaticAsset(
+                    content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                    etag='"%s"' % hashlib.sha1(body).hexdigest(),
+                    body=body,
+                    gzip_body=gzip.compress(body, compresslevel=9),
+                    br_body=brotli.compress(body) if brotli else None
+                )
+        print(f"Cached {len(assets)} static assets from {self.directory}")
+        if '/index.html' in assets:
+            assets['/'] = assets['/index.html']
+        self.assets = assets
+        
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path.split('?', 1)[0])
+
+RESPONSE_FORMATS = ('full', 'compact')
+RESULT_FIELDS = ('url', 'title', 'summary', 'chunk', 'similarity', 'key_points')
+
+def shape_search_response(results: Dict, response_format: str = 'full', fields: List[str] = None) -> Dict:
+    """Project search results to the requested fields and optionally deduplicate per-document data
+    
+    The 'compact' format moves each document's title and summary into a
+    'documents' map keyed by URL, so they're sent once instead of per chunk;
+    if fields leaves out both, the map stays empty.
+    """
+    def project(item: Dict) -> Dict:
+        if not fields:
+            return item
+        return {k: v for k, v in item.items() if k in fields or k == 'url'}
+    
+    if response_format != 'compact':
+        return {
+            'results': [project(r) for r in results['results']],
+            'overall_summary': results['overall_summary']
+        }
+    
+    documents = {}
+    compact_results = []
+    for r in results['results']:
+        document = project({'title': r['title'], 'summary': r['summary']})
+        if document:
+            documents.setdefault(r['url'], document)
+        compact_results.append(project({
+            'url': r['url'],
+            'chunk': r['chunk'],
+            'similarity': r['similarity'],
+            'key_points': r['key_points']
+        }))
+    
+    return {
+        'documents': documents,
+        'results': compact_results,
+        'overall_summary': results['overall_summary']
+    }
+
+def parse_search_request(data: Dict) -> Dict:
+    """Validate a /search body into semantic_search keyword arguments; raises ValueError"""
+    def string_list(name: str) -> Optional[List[str]]:
+        value = data.get(name)
+        if value is None or value == '':
+            return None
+        values = [value] if isinstance(value, str) else value
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"{name} must be a string or a list of strings")
+        return values
+    
+    def timestamp(name: str) -> Optional[datetime]:
+        value = data.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be an ISO 8601 date or datetime, got {value!r}")
+    
+    query = data.get('query', '')
+    if not isinstance(query, str):
+        raise ValueError("query must be a string")
+    try:
+        top_k = int(data.get('top_k', 5))
+    except (TypeError, ValueError):
+        top_k = 0
+    if top_k < 1:
+        raise ValueError(f"top_k must be a positive integer, got {data.get('top_k')!r}")
+    
+    return {
+        'query': query,
+        'top_k': top_k,
+        'tags': string_list('tags'),
+        'domain': string_list('domain'),
+        'since': timestamp('since'),
+        'until': timestamp('until'),
+    }
+
+def parse_response_options(data: Dict) -> Dict:
+    """Validate the format and fields of a /search body into shape_search_response arguments"""
+    response_format = data.get('format', 'full')
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(RESPONSE_FORMATS)}, got {response_format!r}")
+    
+    fields = data.get('fields')
+    if fields is not None:
+        if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+            raise ValueError("fields must be a list of field names")
+        unknown = [f for f in fields if f not in RESULT_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields {unknown}; choose from {', '.join(RESULT_FIELDS)}")
+    
+    return {'response_format': response_format, 'fields': fields}
 
 class AISearchHandler(SimpleHTTPRequestHandler):
-    search_system = AISearchSystem()
+    search_system = None
+    pipeline = None
+    snapshots = None
+    admin_token = None
+    static_assets = None
+    log_requests = True
+
+    def log_message(self, format, *args):
+        if self.log_requests:
+            super().log_message(format, *args)
 
     def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -239,22 +391,116 @@ class AISearchHandler(SimpleHTTPRequestHandler):
 
     def do_OPTIONS(self):
         self.send_response(200)
-        self._send_cors_headers()
+        # No CORS grant for admin routes, so browsers never send the real request
+        if not self.path.startswith('/admin/'):
+            self._send_cors_headers()
         self.end_headers()
 
-    def do_GET(self):
-        if self.path == '/':
-            # Serve index.html
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
+    def _accepts_encoding(self, encoding: str) -> bool:
+        accepted = self.headers.get('Accept-Encoding', '')
+        return any(part.split(';')[0].strip() == encoding for part in accepted.split(','))
+
+    def _read_json(self) -> Dict:
+        content_length = int(self.headers.get('Content-Length', 0))
+        if not content_length:
+            return {}
+        return json.loads(self.rfile.read(content_length).decode('utf-8'))
+
+    def _is_local(self) -> bool:
+        # Admin endpoints are only reachable from the machine the server runs on
+        return self.client_address[0] in ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+    def _host_is_local(self) -> bool:
+        host = self.headers.get('Host', '').strip().lower()
+        # Drop the port: "[::1]:9586" -> "[::1]", "localhost:9586" -> "localhost"
+        name = host[:host.find(']') + 1] if host.startswith('[') else host.partition(':')[0]
+        return name in LOCAL_HOSTNAMES
+
+    def _admin_status(self) -> Dict:
+        slow_log = self.search_system.slow_query_log
+        return {
+            'profiler': self.search_system.profiler.status(),
+            'slow_query_log': {
+                'path': slow_log.path,
+                'threshold_ms': slow_log.threshold_ms,
+                'logged': slow_log.logged,
+            },
+        }
+
+    def _send_json(self, payload, cors: bool = True):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        encoding = None
+        if len(body) >= MIN_COMPRESS_SIZE and self._accepts_encoding('gzip'):
+            # Level 5 is most of level 9's ratio at a fraction of the CPU
+            body = gzip.compress(body, compresslevel=5)
+            encoding = 'gzip'
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if cors:
+            self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_static(self, asset: StaticAsset):
+        body, encoding = asset.body, None
+        if asset.br_body is not None and self._accepts_encoding('br'):
+            body, encoding = asset.br_body, 'br'
+        elif self._accepts_encoding('gzip'):
+            body, encoding = asset.gzip_body, 'gzip'
+        
+        # Each content encoding is its own representation, so each gets its own ETag
+        etag = asset.etag if encoding is None else '%s-%s"' % (asset.etag[:-1], encoding)
+        if_none_match = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if etag in if_none_match or '*' in if_none_match:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
-            
-            template_path = os.path.join(os.path.dirname(__file__), "templates", "index.html")
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        # Clients keep their copy but revalidate it, so a redeploy shows up immediately
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/suggest':
+            # Search-as-you-type: served from an in-memory prefix index, no model call
+            params = parse_qs(url.query)
             try:
-                with open(template_path, 'rb') as f:
-                    self.wfile.write(f.read())
-            except FileNotFoundError:
-                self.wfile.write(b"Error: index.html not found")
+                limit = int(params.get('limit', ['8'])[0])
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                self.send_error(400, "limit must be a positive integer")
+                return
+            limit = min(limit, 20)
+            self._send_json(self.search_system.suggest(params.get('q', [''])[0], limit))
+        elif self.path == '/stats':
+            # Ingest progress while the corpus loads in the background
+            self._send_json({
+                'ingest': self.pipeline.stats() if self.pipeline else {'running': False}
+            })
+        elif url.path.startswith('/admin/'):
+            self._handle_admin('GET', url.path)
+        elif self.static_assets and self.static_assets.get(self.path):
+            self._send_static(self.static_assets.get(self.path))
+        elif self.path.split('?', 1)[0] == '/':
+            # index.html is served from the asset cache; only missing if templates/ has none
+            self.send_error(404, "index.html not found in templates/")
         else:
             # Handle other static files
             try:
@@ -264,36 +510,208 @@ class AISearchHandler(SimpleHTTPRequestHandler):
 
     def do_POST(self):
         if self.path == '/search':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            query = data.get('query', '')
+            try:
+                data = self._read_json()
+                if not isinstance(data, dict):
+                    raise ValueError("Request body must be a JSON object")
+                search_args = parse_search_request(data)
+                response_options = parse_response_options(data)
+            except ValueError as e:
+                self.send_error(400, f"Bad search request: {str(e)}")
+                return
 
             try:
-                results = self.search_system.semantic_search(query)
+                results = self.search_system.semantic_search(**search_args)
                 
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self._send_cors_headers()
-                self.end_headers()
-                
-                response = json.dumps(results)
-                self.wfile.write(response.encode('utf-8'))
+                self._send_json(shape_search_response(results, **response_options))
             except Exception as e:
                 self.send_error(500, f"Search error: {str(e)}")
+        elif self.path.startswith('/admin/'):
+            self._handle_admin('POST', urlparse(self.path).path)
 
-def run_server(port=9586):
-    # Initialize the search system
-    search_system = AISearchSystem()
-    
-    # Load initial data
-    print("Loading initial data...")
-    loader = DataLoader(search_system)
-    loader.load_initial_data()
-    
-    # Set up the server
+    def _check_admin(self) -> bool:
+        """Admin routes answer loopback clients only, and never a cross-origin 'simple' request
+        
+        With an admin token configured the X-Admin-Token header must match it;
+        otherwise the request must be sent as application/json. A browser page
+        can only send either after a CORS preflight, which admin routes refuse.
+        Without a token the Host header must also name the loopback interface:
+        a DNS-rebinding page is same-origin with its own hostname, so it gets
+        past the preflight rule but not this one.
+        """
+        if not self._is_local():
+            self.send_error(403, "Admin endpoints are local only")
+            return False
+        if self.admin_token:
+            if not hmac.compare_digest(self.headers.get('X-Admin-Token', ''), self.admin_token):
+                self.send_error(403, "Missing or wrong X-Admin-Token")
+                return False
+        elif not self._host_is_local():
+            self.send_error(403, "Admin requests without a token must be addressed to localhost")
+            return False
+        elif self.headers.get_content_type() != 'application/json':
+            self.send_error(415, "Admin requests must be sent with Content-Type: application/json")
+            return False
+        return True
+
+    def _handle_admin(self, method: str, path: str):
+        if not self._check_admin():
+            return
+        try:
+            data = self._read_json() if method == 'POST' else {}
+            if not isinstance(data, dict):
+                raise ValueError("Request body must be a JSON object")
+        except ValueError as e:
+            self.send_error(400, f"Bad admin request: {str(e)}")
+            return
+        
+        if path == '/admin/profile':
+            if method == 'POST':
+                # e.g. {"kind": "search", "requests": 20} profiles the next 20 searches
+                kind = data.get('kind', 'search')
+                if kind not in ('search', 'ingest'):
+                    self.send_error(400, f"Unknown profile kind: {kind}")
+                    return
+                try:
+                    self.search_system.profiler.arm(kind, data.get('requests', 1))
+                except (ValueError, TypeError) as e:
+                    self.send_error(400, f"Bad admin request: {str(e)}")
+                    return
+            self._send_json(self._admin_status(), cors=False)
+        elif path == '/admin/slow-log' and method == 'POST':
+            # Only the threshold is adjustable here; the log file is set at startup
+            if 'path' in data:
+                self.send_error(400, "The slow query log path can only be set with --slow-query-log")
+                return
+            try:
+                if 'threshold_ms' in data:
+                    self.search_system.slow_query_log.threshold_ms = float(data['threshold_ms'])
+            except (ValueError, TypeError) as e:
+                self.send_error(400, f"Bad admin request: {str(e)}")
+                return
+            self._send_json(self._admin_status(), cors=False)
+        elif path == '/admin/snapshot':
+            if not self.snapshots:
+                self.send_error(404, "Server is not serving snapshots")
+                return
+            if method == 'POST':
+                # {"action": "load", "name": ...} (default: CURRENT) or {"action": "rollback"}
+                action = data.get('action', 'load')
+                if action not in ('load', 'rollback'):
+                    self.send_error(400, f"Unknown snapshot action: {action}")
+                    return
+                if not self.snapshots.load(data.get('name'), rollback=action == 'rollback'):
+                    self.send_error(409, "A snapshot is already loading")
+                    return
+            self._send_json(self.snapshots.status(), cors=False)
+        else:
+            self.send_error(404, f"Unknown admin endpoint: {method} {path}")
+
+class SnapshotLoader:
+    """Opens snapshots in the background and swaps them into AISearchHandler between requests
+
+    A request reads AISearchHandler.search_system once, so it finishes on the
+    system it started with while later requests already see the new one.
+    """
+
+    def __init__(self, manager: SnapshotManager, encoder, slow_query_log: SlowQueryLog, profiler: Profiler):
+        self.manager = manager
+        self.encoder = encoder
+        self.slow_query_log = slow_query_log
+        self.profiler = profiler
+        self.serving: Optional[str] = None
+        self.loading: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.swapped_at: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def open(self, name: str):
+        """Verify a snapshot and return a warmed-up search system for it"""
+        manifest = self.manager.verify(name)
+        if manifest.get('shards'):
+            system = ShardedSearchSystem(
+                self.manager.path(name), encoder=self.encoder,
+                slow_query_log=self.slow_query_log, profiler=self.profiler
+            )
+        else:
+            system = AISearchSystem(
+                self.manager.db_path(name), encoder=self.encoder,
+                slow_query_log=self.slow_query_log, profiler=self.profiler
+            )
+        # Build the in-memory indexes and pull the vectors into the page cache
+        # now, so the first request after the swap doesn't pay for it
+        system.warm_up()
+        return system
+
+    def load(self, name: str = None, rollback: bool = False, background: bool = True) -> bool:
+        """Load and swap in a snapshot (default: CURRENT); False if a load is already running"""
+        if not self._lock.acquire(blocking=False):
+            return False
+        if background:
+            threading.Thread(target=self._load, args=(name, rollback), name="snapshot-load", daemon=True).start()
+        else:
+            self._load(name, rollback)
+        return True
+
+    def _load(self, name: Optional[str], rollback: bool):
+        try:
+            if rollback:
+                name = self.manager.previous(self.serving)
+                if name is None:
+                    raise SnapshotError("No older snapshot to roll back to")
+            name = name or self.manager.current()
+            if name is None:
+                raise SnapshotError(f"No snapshot published in {self.manager.snapshot_dir}")
+            self.loading = name
+            
+            system = self.open(name)
+            if self.manager.current() != name:
+                self.manager.publish(name)
+            AISearchHandler.search_system = system
+            self.serving = name
+            self.swapped_at = datetime.now().isoformat()
+            self.last_error = None
+            print(f"Now serving snapshot {name}")
+            
+            self.manager.gc(protect=[name])
+        except Exception as e:
+            self.last_error = f"{name}: {e}"
+            print(f"Error loading snapshot {name}: {e}")
+        finally:
+            self.loading = None
+            self._lock.release()
+
+    def watch(self, interval: float = 30.0):
+        """Swap in whatever CURRENT points at whenever it changes, e.g. after an import on a replica"""
+        def poll():
+            while True:
+                time.sleep(interval)
+                current = self.manager.current()
+                if current and current != self.serving:
+                    self.load(current)
+
+        threading.Thread(target=poll, name="snapshot-watch", daemon=True).start()
+
+    def status(self) -> Dict:
+        return {
+            'serving': self.serving,
+            'loading': self.loading,
+            'current': self.manager.current(),
+            'available': self.manager.list(),
+            'swapped_at': self.swapped_at,
+            'last_error': self.last_error,
+        }
+
+def create_server(search_system, port=9586, pipeline=None, threaded=False, log_requests=True, snapshots=None,
+                  admin_token=None):
+    """Build the HTTP server around a search system without starting it"""
     server_address = ('', port)
     AISearchHandler.search_system = search_system  # Share the search system instance
+    AISearchHandler.pipeline = pipeline
+    AISearchHandler.snapshots = snapshots
+    AISearchHandler.admin_token = admin_token or os.environ.get('SEARCH_ADMIN_TOKEN')
+    AISearchHandler.static_assets = StaticAssetCache(os.path.join(os.path.dirname(__file__), "templates"))
+    AISearchHandler.log_requests = log_requests
     handler = AISearchHandler
     handler.extensions_map = {
         '.html': 'text/html',
@@ -302,14 +720,94 @@ def run_server(port=9586):
         '': 'application/octet-stream',
     }
     
-    httpd = HTTPServer(server_address, handler)
+    server_class = ThreadingHTTPServer if threaded else HTTPServer
+    return server_class(server_address, handler)
+
+def run_server(port=9586, encoder=None, reembed=False, ingest_workers=0,
+               db_path=None, load_data=True, threaded=False, log_requests=True,
+               slow_query_log=None, slow_query_ms=None, profile_dir=None,
+               snapshot_dir=None, snapshot_poll=0, admin_token=None, shard_dir=None):
+    slow_query_log = SlowQueryLog(slow_query_log, slow_query_ms)
+    profiler = Profiler(profile_dir)
+    
+    snapshots = None
+    pipeline = None
+    if snapshot_dir:
+        # Snapshots are built offline (snapshots.py build), so nothing is loaded here
+        snapshots = SnapshotLoader(SnapshotManager(snapshot_dir), get_encoder(encoder), slow_query_log, profiler)
+        snapshots.load(background=False)
+        if snapshots.serving is None:
+            raise SystemExit(f"Could not load a snapshot from {snapshot_dir}: {snapshots.last_error}")
+        search_system = AISearchHandler.search_system
+        if snapshot_poll:
+            snapshots.watch(snapshot_poll)
+    else:
+        # Initialize the search system
+        if shard_dir:
+            search_system = ShardedSearchSystem(
+                shard_dir, encoder=get_encoder(encoder), reembed=reembed,
+                slow_query_log=slow_query_log, profiler=profiler
+            )
+        else:
+            search_system = AISearchSystem(
+                db_path, encoder=get_encoder(encoder), reembed=reembed,
+                slow_query_log=slow_query_log, profiler=profiler
+            )
+        
+        # Build the filter and suggestion indexes off the request path, so the
+        # first search or keystroke doesn't wait for them
+        threading.Thread(target=search_system.warm_up, name="warm-up", daemon=True).start()
+        
+        # Load initial data in the background so the server can start right away
+        if load_data:
+            print("Loading initial data...")
+            loader = DataLoader(search_system, parallel_workers=ingest_workers)
+            pipeline = loader.load_initial_data(background=True)
+    
+    # Set up the server
+    httpd = create_server(search_system, port, pipeline, threaded=threaded, log_requests=log_requests,
+                          snapshots=snapshots, admin_token=admin_token)
     print(f"Server running on port {port}")
     httpd.serve_forever()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="AI search server")
+    parser.add_argument('--port', type=int, default=9586)
+    parser.add_argument('--encoder', choices=['auto', 'transformer', 'onnx', 'hashing'], default=None,
+                        help="Embedding backend (default: $SEARCH_ENCODER or auto)")
+    parser.add_argument('--reembed', action='store_true',
+                        help="Re-embed the knowledge base if it was built with a different encoder")
+    parser.add_argument('--ingest-workers', type=int, default=0,
+                        help="Processes used to embed documents while loading (0: embed in the pipeline's embed threads)")
+    parser.add_argument('--db', default=None, help="Knowledge base to serve (default: knowledge_base.db)")
+    parser.add_argument('--shards', default=None, metavar='DIR',
+                        help="Serve and load the sharded knowledge base in DIR instead of --db (see shards.py)")
+    parser.add_argument('--no-load', action='store_true', help="Serve the knowledge base as is, without loading URLs")
+    parser.add_argument('--threaded', action='store_true', help="Handle each request in its own thread")
+    parser.add_argument('--quiet', action='store_true', help="Don't log every request")
+    parser.add_argument('--slow-query-log', default=None,
+                        help="Append slow and failed searches to this JSONL file (default: $SLOW_QUERY_LOG)")
+    parser.add_argument('--slow-query-ms', type=float, default=None,
+                        help="Searches slower than this are logged (default: $SLOW_QUERY_MS or 500)")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Where on-demand cProfile dumps go (default: $PROFILE_DIR or profiles/)")
+    parser.add_argument('--admin-token', default=None,
+                        help="Require this X-Admin-Token on /admin/* (default: $SEARCH_ADMIN_TOKEN; "
+                             "without one, admin requests must be sent as application/json)")
+    parser.add_argument('--snapshots', default=None,
+                        help="Serve the CURRENT snapshot from this directory instead of --db, with hot swaps")
+    parser.add_argument('--snapshot-poll', type=float, default=0,
+                        help="Check CURRENT every N seconds and swap in a newly published snapshot")
+    args = parser.parse_args()
+    
     # Initialize system and create required directories
     os.makedirs(os.path.join(os.path.dirname(__file__), "templates"), exist_ok=True)
     
     # Start the server
     print("Database initialized and ready")
-    run_server(port=9586)
\ No newline at end of file
+    run_server(port=args.port, encoder=args.encoder, reembed=args.reembed,
+               ingest_workers=args.ingest_workers, db_path=args.db, load_data=not args.no_load,
+               threaded=args.threaded, log_requests=not args.quiet,
+               slow_query_log=args.slow_query_log, slow_query_ms=args.slow_query_ms,
+               profile_dir=args.profile_dir, snapshot_dir=args.snapshots,
+               snapshot_poll=args.snapshot_poll, admin_token=args.admin_token, shard_dir=args.shards)
@@ -0,0 +1,232 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from find import UrlFinder
+
+# Marks the end of input; each stage forwards one per downstream worker once all its workers are done
+_STOP = object()
+
+
+@dataclass
+class IngestItem:
+    url: str
+    html: Optional[str] = None
+    content: Optional[object] = None
+    prepared: Optional[object] = None
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+
+
+class Stage:
+    """A pool of worker threads reading from one bounded queue and writing to the next"""
+
+    def __init__(self, name: str, func: Callable[[IngestItem], Optional[IngestItem]], workers: int,
+                 inbox: queue.Queue, outbox: Optional[queue.Queue],
+                 on_error: Callable[[str, IngestItem, Exception], None]):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_error = on_error
+        self.stats = StageStats()
+        self.downstream_workers = 0
+        self._lock = threading.Lock()
+        self._running = workers
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                item = self.inbox.get()
+                if item is _STOP:
+                    break
+                
+                result = self._process(item)
+                
+                # put() blocks while the next queue is full, which throttles this stage
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+        finally:
+            # Always count this worker out, or downstream never gets its stop markers
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last and self.outbox is not None:
+                for _ in range(self.downstream_workers):
+                    self.outbox.put(_STOP)
+
+    def _process(self, item: IngestItem) -> Optional[IngestItem]:
+        started = time.perf_counter()
+        try:
+            result = self.func(item)
+        except Exception as e:
+            with self._lock:
+                self.stats.failed += 1
+            try:
+                self.on_error(self.name, item, e)
+            except Exception as handler_error:
+                print(f"Error handling {self.name} failure for {item.url}: {handler_error}")
+            return None
+        else:
+            with self._lock:
+                self.stats.processed += 1
+            return result
+        finally:
+            with self._lock:
+                self.stats.busy_seconds += time.perf_counter() - started
+
+
+class IngestPipeline:
+    """Concurrent discover -> fetch -> extract -> embed -> store pipeline connected by bounded queues
+
+    Each stage but store has its own worker count. Store is a single writer,
+    so SQLite never sees concurrent write transactions.
+    """
+
+    def __init__(self, fetch: Callable[[IngestItem], Optional[IngestItem]],
+                 extract: Callable[[IngestItem], Optional[IngestItem]],
+                 embed: Callable[[IngestItem], Optional[IngestItem]],
+                 store: Callable[[IngestItem], Optional[IngestItem]],
+                 should_skip: Callable[[str], bool] = None,
+                 on_error: Callable[[str, IngestItem, Exception], None] = None,
+                 on_done: Callable[[], None] = None,
+                 fetch_workers: int = 8, extract_workers: int = 2, embed_workers: int = 2,
+                 queue_size: int = 32):
+        self.should_skip = should_skip or (lambda url: False)
+        self.on_error = on_error or self._print_error
+        # Runs after the last item is stored, before join() returns
+        self.on_done = on_done
+
+        self.queues = {
+            'fetch': queue.Queue(maxsize=queue_size),
+            'extract': queue.Queue(maxsize=queue_size),
+            'embed': queue.Queue(maxsize=queue_size),
+            'store': queue.Queue(maxsize=queue_size),
+        }
+        self.stages = [
+            Stage('fetch', fetch, fetch_workers, self.queues['fetch'], self.queues['extract'], self.on_error),
+            Stage('extract', extract, extract_workers, self.queues['extract'], self.queues['embed'], self.on_error),
+            Stage('embed', embed, embed_workers, self.queues['embed'], self.queues['store'], self.on_error),
+            Stage('store', store, 1, self.queues['store'], None, self.on_error),
+        ]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.downstream_workers = next_stage.workers
+
+        self.discovered = 0
+        self.skipped = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._discover_thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    @staticmethod
+    def _print_error(stage: str, item: IngestItem, error: Exception):
+        print(f"Error in {stage} stage for {item.url}: {error}")
+
+    def start(self, sources: Iterable):
+        """Start ingesting in the background; sources may be URL strings or UrlFinder instances"""
+        self.started_at = time.time()
+        for stage in self.stages:
+            stage.start()
+        self._discover_thread = threading.Thread(
+            target=self._discover, args=(sources,), name="discover", daemon=True
+        )
+        self._discover_thread.start()
+        threading.Thread(target=self._wait_for_stages, name="pipeline-monitor", daemon=True).start()
+        return self
+
+    def _discover(self, sources: Iterable):
+        fetch_queue = self.queues['fetch']
+
+        def enqueue(url: str):
+            if self.should_skip(url):
+                self.skipped += 1
+                return
+            self.discovered += 1
+            fetch_queue.put(IngestItem(url=url))
+
+        try:
+            for source in sources:
+                if isinstance(source, UrlFinder):
+                    # Stream pages into the fetch queue as the crawler finds them
+                    source.on_found = lambda url_data: enqueue(url_data.url)
+                    source.find_urls()
+                else:
+                    enqueue(source)
+        except Exception as e:
+            print(f"Error in discover stage: {e}")
+        finally:
+            for _ in range(self.stages[0].workers):
+                fetch_queue.put(_STOP)
+
+    def _wait_for_stages(self):
+        self._discover_thread.join()
+        for stage in self.stages:
+            stage.join()
+        if self.on_done:
+            self.on_done()
+        self.finished_at = time.time()
+        self._done.set()
+
+    def join(self, timeout: float = None) -> bool:
+        """Wait for every queued URL to be stored; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and not self._done.is_set()
+
+    def stats(self) -> Dict:
+        """Snapshot of per-stage counters, queue depths and end-to-end throughput"""
+        if self.started_at is None:
+            return {'running': False}
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        stored = self.stages[-1].stats.processed
+        return {
+            'running': self.running,
+            'elapsed_seconds': round(elapsed, 2),
+            'discovered': self.discovered,
+            'skipped': self.skipped,
+            'stored': stored,
+            'docs_per_second': round(stored / elapsed, 3) if elapsed > 0 else 0.0,
+            'stages': {
+                stage.name: {
+                    'workers': stage.workers,
+                    'queue_depth': stage.inbox.qsize(),
+                    'processed': stage.stats.processed,
+                    'failed': stage.stats.failed,
+                    'busy_seconds': round(stage.stats.busy_seconds, 2),
+                }
+                for stage in self.stages
+            },
+        }
+
+    def report_progress(self, interval: float = 10.0):
+        """Print stats periodically until the pipeline finishes"""
+        def report():
+            while not self._done.wait(interval):
+                stats = self.stats()
+                depths = ', '.join(f"{name}={s['queue_depth']}" for name, s in stats['stages'].items())
+                print(f"Ingest: {stats['stored']} stored, {stats['docs_per_second']} docs/s, queues: {depths}")
+            print(f"Ingest finished: {self.stats()['stored']} documents stored")
+
+        threading.Thread(target=report, name="pipeline-report", daemon=True).start()
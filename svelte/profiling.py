@@ -0,0 +1,171 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class StageTimer:
+    """Wall-clock milliseconds spent in each named stage of one operation"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # Sizes worth logging next to the timings, e.g. chunks scored
+        self.counts: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(ms, 3) for name, ms in self.stages.items()}
+
+
+class SlowQueryLog:
+    """Appends a JSON line for every search slower than threshold_ms, and for every failed one
+
+    Disabled when path is None. Defaults come from $SLOW_QUERY_LOG and
+    $SLOW_QUERY_MS (500).
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold_ms: float = None):
+        self.path = path if path is not None else os.environ.get('SLOW_QUERY_LOG')
+        if threshold_ms is None:
+            threshold_ms = float(os.environ.get('SLOW_QUERY_MS', 500))
+        self.threshold_ms = threshold_ms
+        self.logged = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, entry: Dict):
+        """Write entry if it is slow enough or has an error; entry must have total_ms"""
+        if not self.enabled:
+            return
+        if entry['total_ms'] < self.threshold_ms and not entry.get('error'):
+            return
+        line = json.dumps({'logged_at': datetime.now().isoformat(), **entry}, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.logged += 1
+
+
+class Profiler:
+    """Profiles the next N operations of a kind ('search', 'ingest') with cProfile on request
+
+    Each profiled operation is dumped to its own .prof file in output_dir,
+    readable with pstats or snakeviz. Only one operation is profiled at a
+    time; others that overlap with it run unprofiled. cProfile only sees the
+    thread it runs on, so work an operation hands to helper threads must be
+    wrapped in include_thread(), and work done in other processes is
+    profiled there using a path from claim_dump().
+    """
+
+    def __init__(self, output_dir: str = None):
+        self.output_dir = output_dir or os.environ.get(
+            'PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles')
+        )
+        self.remaining: Dict[str, int] = {}
+        self.dumps: List[str] = []
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def arm(self, kind: str, count: int):
+        """Profile the next `count` operations of this kind"""
+        with self._lock:
+            self.remaining[kind] = max(int(count), 0)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'output_dir': self.output_dir,
+                'remaining': dict(self.remaining),
+                'dumps': list(self.dumps[-50:]),
+            }
+
+    def _claim(self, kind: str) -> bool:
+        with self._lock:
+            if self.remaining.get(kind, 0) <= 0:
+                return False
+            if not self._active.acquire(blocking=False):
+                return False
+            self.remaining[kind] -= 1
+            return True
+
+    def _dump_path(self, kind: str, label: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label)[:40]
+        return os.path.join(
+            self.output_dir,
+            f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{safe_label}.prof"
+        )
+
+    @contextmanager
+    def maybe_profile(self, kind: str, label: str = ''):
+        """Profile the enclosed block if this kind is armed; otherwise a no-op
+
+        Yields a session to pass to include_thread(), or None when not profiling.
+        """
+        if not self._claim(kind):
+            yield None
+            return
+
+        helpers: List[cProfile.Profile] = []
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield helpers
+        finally:
+            profile.disable()
+            self._active.release()
+            stats = pstats.Stats(profile)
+            for helper in helpers:
+                stats.add(helper)
+            path = self._dump_path(kind, label)
+            stats.dump_stats(path)
+            with self._lock:
+                self.dumps.append(path)
+            print(f"Profile written to {path}")
+
+    @contextmanager
+    def include_thread(self, session: Optional[List[cProfile.Profile]]):
+        """Profile the enclosed block, run on a helper thread, into the session's dump
+
+        The block must finish before the maybe_profile() block that made the session.
+        """
+        if session is None:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            session.append(profile)
+
+    def claim_dump(self, kind: str, label: str = '') -> Optional[str]:
+        """Claim one armed operation that runs in another process; returns where it should dump_stats"""
+        with self._lock:
+            if self.remaining.get(kind, 0) <= 0:
+                return None
+            self.remaining[kind] -= 1
+            path = self._dump_path(kind, label)
+            self.dumps.append(path)
+        return path
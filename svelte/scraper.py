@@ -1,12 +1,19 @@
 from bs4 import BeautifulSoup
 import requests
 import sqlite3
-from typing import List, Dict, Tuple
+import heapq
+import json
+import bisect
+import threading
+from typing import List, Dict, Tuple, Optional, Union
 from dataclasses import dataclass
 from datetime import datetime
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from encoders import Encoder, DEFAULT_MODEL, get_encoder
+from profiling import SlowQueryLog, Profiler, StageTimer
+from suggest import PrefixIndex, RefreshingPrefixIndex
 import os
+from urllib.parse import urlparse
 from sklearn.cluster import KMeans
 import nltk
 from nltk.tokenize import sent_tokenize
@@ -22,13 +29,115 @@ class WebContent:
     timestamp: datetime
     metadata: Dict
 
+@dataclass
+class PreparedContent:
+    """A document with everything computed that store_content needs, ready to write"""
+    content: WebContent
+    summary: str
+    chunks: List[str]
+    embeddings: np.ndarray
+    key_points: List[List[str]]
+
+def write_tags(cursor, content_id: int, tags: List[str]):
+    """Link a document to its tags in the normalized tag tables"""
+    for tag in tags:
+        cursor.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+        cursor.execute("""
+            INSERT OR IGNORE INTO content_tags (content_id, tag_id)
+            SELECT ?, id FROM tags WHERE name = ?
+        """, (content_id, tag))
+
+def _to_timestamp(value: Union[str, datetime, None]) -> Optional[str]:
+    """Normalize a filter bound to the format sqlite3 stores datetimes in"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat(sep=' ')
+
+def content_version(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Changes whenever a document is added, re-stored or deleted, by this process or any other
+    
+    Re-storing a URL gives it a new (AUTOINCREMENT, never reused) id, so
+    MAX(id) moves on every write and COUNT(*) on every delete.
+    """
+    max_id, count = conn.execute("SELECT MAX(id), COUNT(*) FROM web_content").fetchone()
+    return max_id or 0, count
+
+class FilterIndex:
+    """Precomputed document-ID arrays per tag and domain, plus a timestamp-sorted ID list"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        # Taken first, so a write racing the build only causes an extra rebuild later
+        self.version = content_version(conn)
+        by_tag: Dict[str, List[int]] = {}
+        for name, content_id in conn.execute("""
+            SELECT t.name, ct.content_id
+            FROM content_tags ct
+            JOIN tags t ON ct.tag_id = t.id
+        """):
+            by_tag.setdefault(name, []).append(content_id)
+        
+        by_domain: Dict[str, List[int]] = {}
+        dated = []
+        for content_id, domain, timestamp in conn.execute(
+            "SELECT id, domain, timestamp FROM web_content"
+        ):
+            by_domain.setdefault(domain or '', []).append(content_id)
+            if timestamp is not None:
+                dated.append((str(timestamp), content_id))
+        
+        self.all_ids = np.array(sorted(i for ids in by_domain.values() for i in ids), dtype=np.int64)
+        self.by_tag = {k: np.unique(np.array(v, dtype=np.int64)) for k, v in by_tag.items()}
+        self.by_domain = {k: np.unique(np.array(v, dtype=np.int64)) for k, v in by_domain.items()}
+        dated.sort()
+        self.timestamps = [t for t, _ in dated]
+        self.ids_by_time = np.array([i for _, i in dated], dtype=np.int64)
+    
+    def candidates(self, tags: List[str] = None, domain: Union[str, List[str]] = None,
+                   since=None, until=None) -> Optional[np.ndarray]:
+        """Sorted IDs matching every given filter, or None when no filter is set"""
+        empty = np.array([], dtype=np.int64)
+        result = None
+        
+        # A document must carry all requested tags
+        if isinstance(tags, str):
+            tags = [tags]
+        for tag in tags or []:
+            ids = self.by_tag.get(tag, empty)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        
+        if domain:
+            domains = [domain] if isinstance(domain, str) else domain
+            ids = np.unique(np.concatenate([self.by_domain.get(d, empty) for d in domains]))
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        
+        if since is not None or until is not None:
+            lo = 0 if since is None else bisect.bisect_left(self.timestamps, _to_timestamp(since))
+            hi = len(self.timestamps) if until is None else bisect.bisect_right(self.timestamps, _to_timestamp(until))
+            ids = np.sort(self.ids_by_time[lo:hi])
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        
+        return result
+
+class EncoderMismatchError(ValueError):
+    """The store holds vectors from a different encoder than the one in use"""
+
 class AISearchSystem:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, encoder: Encoder = None, reembed: bool = False,
+                 slow_query_log: SlowQueryLog = None, profiler: Profiler = None):
         if db_path is None:
             db_path = os.path.join(os.path.dirname(__file__), "knowledge_base.db")
         self.db_path = db_path
-        self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        # Shards share one encoder instead of loading a model copy each
+        self.encoder = encoder or get_encoder()
+        self.slow_query_log = slow_query_log or SlowQueryLog()
+        self.profiler = profiler or Profiler()
+        self._filter_index: Optional[FilterIndex] = None
+        self._filter_lock = threading.Lock()
+        self._prefix_index = RefreshingPrefixIndex(self._build_prefix_index, self.content_version)
         self._init_database()
+        self._check_encoder(reembed)
     
     def _init_database(self):
         with sqlite3.connect(self.db_path) as conn:
@@ -54,6 +163,109 @@ class AISearchSystem:
                     FOREIGN KEY(content_id) REFERENCES web_content(id)
                 )
             """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tags (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_tags (
+                    content_id INTEGER,
+                    tag_id INTEGER,
+                    PRIMARY KEY(content_id, tag_id),
+                    FOREIGN KEY(content_id) REFERENCES web_content(id),
+                    FOREIGN KEY(tag_id) REFERENCES tags(id)
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            
+            self._migrate_filter_columns(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_content ON embeddings(content_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_web_content_domain ON web_content(domain)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_web_content_timestamp ON web_content(timestamp)")
+    
+    def _migrate_filter_columns(self, conn: sqlite3.Connection):
+        """Add the domain column and normalized tags to databases created before filters existed"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(web_content)")]
+        if 'domain' in columns:
+            return
+        
+        conn.execute("ALTER TABLE web_content ADD COLUMN domain TEXT")
+        cursor = conn.cursor()
+        for content_id, url, tags in conn.execute("SELECT id, url, tags FROM web_content").fetchall():
+            cursor.execute("UPDATE web_content SET domain = ? WHERE id = ?", (urlparse(url).netloc, content_id))
+            write_tags(cursor, content_id, [t for t in (tags or '').split(',') if t])
+    
+    def _check_encoder(self, reembed: bool):
+        """Make sure stored vectors come from the same vector space as self.encoder"""
+        with sqlite3.connect(self.db_path) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM index_meta"))
+            if 'encoder_space' not in meta:
+                has_vectors = conn.execute("SELECT 1 FROM embeddings LIMIT 1").fetchone()
+                if not has_vectors:
+                    self._record_encoder(conn)
+                    return
+                # Stores from before encoders were pluggable were always built with MiniLM
+                meta = {'encoder_space': DEFAULT_MODEL, 'encoder_dim': '384'}
+                conn.executemany("INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)", meta.items())
+        
+        if meta['encoder_space'] == self.encoder.space and int(meta['encoder_dim']) == self.encoder.dim:
+            return
+        if not reembed:
+            raise EncoderMismatchError(
+                f"{self.db_path} was embedded with {meta['encoder_space']} ({meta['encoder_dim']} dims) "
+                f"but the current encoder is {self.encoder.space} ({self.encoder.dim} dims); "
+                f"pass reembed=True to re-embed it"
+            )
+        self.reembed()
+    
+    def _record_encoder(self, conn: sqlite3.Connection):
+        conn.executemany("INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)", [
+            ('encoder_space', self.encoder.space),
+            ('encoder_dim', str(self.encoder.dim)),
+            ('encoder_name', self.encoder.name),
+        ])
+    
+    def reembed(self, batch_size: int = 256):
+        """Re-encode every stored chunk with the current encoder
+        
+        Runs in a single transaction, so searches never see a mix of old and
+        new vectors and an interrupted run leaves the old index intact.
+        """
+        print(f"Re-embedding {self.db_path} with {self.encoder.space}...")
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT id, chunk_text FROM embeddings").fetchall()
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                embeddings = self.encoder.encode([text for _, text in batch])
+                conn.executemany(
+                    "UPDATE embeddings SET embedding = ? WHERE id = ?",
+                    [(embedding.tobytes(), chunk_id) for (chunk_id, _), embedding in zip(batch, embeddings)]
+                )
+            self._record_encoder(conn)
+        print(f"Re-embedded {len(rows)} chunks")
+    
+    def filter_index(self) -> FilterIndex:
+        """Return the filter index, rebuilding it if content changed since it was built
+        
+        Writes from other processes (e.g. loader.py while the server runs) are
+        noticed too, by comparing content_version before reusing the index.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            version = content_version(conn)
+            with self._filter_lock:
+                if self._filter_index is None or self._filter_index.version != version:
+                    self._filter_index = FilterIndex(conn)
+                return self._filter_index
     
     def generate_summary(self, text: str, num_sentences: int = 3) -> str:
         """Generate a summary using extractive summarization"""
@@ -63,7 +275,7 @@ class AISearchSystem:
             return text
             
         # Generate embeddings for all sentences
-        embeddings = self.embedding_model.encode(sentences)
+        embeddings = self.encoder.encode(sentences)
         
         # Calculate sentence importance using similarity to mean embedding
         mean_embedding = np.mean(embeddings, axis=0)
@@ -85,7 +297,7 @@ class AISearchSystem:
         if len(sentences) < 2:
             return sentences
             
-        embeddings = self.embedding_model.encode(sentences)
+        embeddings = self.encoder.encode(sentences)
         
         # Use clustering to identify main topics
         n_clusters = min(len(sentences) // 3, 5)  # Adjust number of clusters based on content length
@@ -107,59 +319,145 @@ class AISearchSystem:
         
         return key_points
 
-    def semantic_search(self, query: str, top_k: int = 5) -> Dict:
-        """Enhanced semantic search with summarization and key points"""
-        query_embedding = self._compute_embedding(query)
+    def invalidate_filter_index(self):
+        """Force the filter index to be rebuilt on the next search"""
+        with self._filter_lock:
+            self._filter_index = None
+        self._prefix_index.invalidate()
+    
+    def prefix_index(self) -> PrefixIndex:
+        """Return the suggestion index; after content changes it refreshes in the background"""
+        return self._prefix_index.get()
+    
+    def _build_prefix_index(self) -> PrefixIndex:
+        with sqlite3.connect(self.db_path) as conn:
+            return PrefixIndex(conn)
+    
+    def content_version(self) -> Tuple[int, int]:
+        with sqlite3.connect(self.db_path) as conn:
+            return content_version(conn)
+    
+    def warm_up(self):
+        """Build the in-memory indexes and pull the vectors into the page cache before serving"""
+        self.filter_index()
+        self.prefix_index()
+        self.search_by_embedding(self._compute_embedding("warm up"), top_k=1)
+    
+    def suggest(self, prefix: str, limit: int = 8) -> Dict:
+        """Prefix completions and document previews for search-as-you-type"""
+        return self.prefix_index().suggest(prefix, limit)
+
+    def semantic_search(self, query: str, top_k: int = 5, tags: List[str] = None,
+                        domain: Union[str, List[str]] = None, since=None, until=None) -> Dict:
+        """Enhanced semantic search with summarization and key points
         
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT e.chunk_text, e.embedding, e.key_points,
-                           w.url, w.title, w.summary
-                    FROM embeddings e
-                    JOIN web_content w ON e.content_id = w.id
-                """)
-                
-                results = []
-                for chunk_text, embedding_bytes, key_points, url, title, summary in cursor.fetchall():
-                    embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
-                    similarity = np.dot(query_embedding, embedding) / (
-                        np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
-                    )
-                    
-                    results.append({
-                        'chunk': chunk_text,
-                        'url': url,
-                        'title': title or 'Untitled',
-                        'similarity': float(similarity),
-                        'key_points': key_points.split('||') if key_points else [],
-                        'summary': summary
-                    })
+        tags, domain and since/until restrict the search to matching documents
+        before any vectors are scored.
+        """
+        timer = StageTimer()
+        entry = {
+            'query': query,
+            'top_k': top_k,
+            'filters': {k: v for k, v in
+                        {'tags': tags, 'domain': domain, 'since': since, 'until': until}.items() if v},
+        }
+        
+        with self.profiler.maybe_profile('search', query):
+            with timer.stage('encode'):
+                query_embedding = self._compute_embedding(query)
+            
+            try:
+                with timer.stage('filter'):
+                    index = self.filter_index()
+                    content_ids = index.candidates(tags, domain, since, until)
+                timer.counts['corpus_docs'] = len(index.all_ids)
+                timer.counts['candidate_docs'] = len(index.all_ids) if content_ids is None else len(content_ids)
                 
-                results.sort(key=lambda x: x['similarity'], reverse=True)
-                top_results = results[:top_k]
+                top_results = self.search_by_embedding(query_embedding, top_k, content_ids, timer)
                 
                 # Generate a combined summary for top results
-                combined_text = ' '.join(r['chunk'] for r in top_results)
-                overall_summary = self.generate_summary(combined_text)
+                with timer.stage('summarize'):
+                    combined_text = ' '.join(r['chunk'] for r in top_results)
+                    overall_summary = self.generate_summary(combined_text)
                 
-                return {
+                response = {
                     'results': top_results,
                     'overall_summary': overall_summary
                 }
                 
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return {'results': [], 'overall_summary': ''}
-        except Exception as e:
-            print(f"Error during search: {e}")
-            return {'results': [], 'overall_summary': ''}
+            except sqlite3.Error as e:
+                print(f"Database error: {e}")
+                entry['error'] = f"Database error: {e}"
+                response = {'results': [], 'overall_summary': ''}
+            except Exception as e:
+                print(f"Error during search: {e}")
+                entry['error'] = f"Error during search: {e}"
+                response = {'results': [], 'overall_summary': ''}
+        
+        self.slow_query_log.record({
+            **entry,
+            **timer.counts,
+            'result_count': len(response['results']),
+            'stages_ms': timer.as_dict(),
+            'total_ms': round(timer.total_ms, 3),
+        })
+        return response
+
+    def search_by_embedding(self, query_embedding: np.ndarray, top_k: int = 5,
+                            content_ids: np.ndarray = None, timer: StageTimer = None) -> List[Dict]:
+        """Score stored chunks against a precomputed query embedding and return the top_k
+        
+        When content_ids is given only chunks of those documents are read and scored.
+        """
+        timer = timer or StageTimer()
+        query = """
+            SELECT e.chunk_text, e.embedding, e.key_points,
+                   w.url, w.title, w.summary
+            FROM embeddings e
+            JOIN web_content w ON e.content_id = w.id
+        """
+        params = ()
+        if content_ids is not None:
+            if len(content_ids) == 0:
+                return []
+            # json_each avoids SQLite's bound-parameter limit for large candidate sets
+            query += " WHERE e.content_id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(content_ids.tolist()),)
+        
+        with timer.stage('fetch'):
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        timer.counts['chunks_scored'] = len(rows)
+        
+        if not rows:
+            return []
+        
+        # Score all chunks in one matrix product (numpy releases the GIL here,
+        # so shards searched from a thread pool run in parallel)
+        with timer.stage('score'):
+            matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_embedding)
+            similarities = matrix @ query_embedding / np.maximum(norms, 1e-12)
+            
+            top_indices = heapq.nlargest(top_k, range(len(rows)), key=lambda i: similarities[i])
+        results = []
+        for i in top_indices:
+            chunk_text, _, key_points, url, title, summary = rows[i]
+            results.append({
+                'chunk': chunk_text,
+                'url': url,
+                'title': title or 'Untitled',
+                'similarity': float(similarities[i]),
+                'key_points': key_points.split('||') if key_points else [],
+                'summary': summary
+            })
+        return results
 
     def _compute_embedding(self, text: str) -> np.ndarray:
         """Compute embedding for a piece of text"""
-        embedding = self.embedding_model.encode(text)
-        return embedding.astype(np.float32)
+        return self.encoder.encode([text])[0].astype(np.float32)
 
     def _chunk_text(self, text: str, chunk_size: int = 512) -> List[str]:
         """Split text into chunks while preserving sentence boundaries"""
@@ -182,45 +480,72 @@ class AISearchSystem:
         
         return chunks
 
+    def prepare_content(self, content: WebContent) -> PreparedContent:
+        """Do the CPU-heavy part of storing: summary, chunking, embeddings and key points"""
+        # Generate summary for the entire content
+        summary = self.generate_summary(content.content)
+        
+        # Process chunks with key points
+        chunks = self._chunk_text(content.content)
+        embeddings = self.encoder.encode(chunks) if chunks else np.zeros((0, self.encoder.dim), dtype=np.float32)
+        key_points = [self.extract_key_points(chunk) for chunk in chunks]
+        
+        return PreparedContent(
+            content=content,
+            summary=summary,
+            chunks=chunks,
+            embeddings=embeddings.astype(np.float32),
+            key_points=key_points
+        )
+    
+    def write_prepared(self, cursor: sqlite3.Cursor, prepared: PreparedContent):
+        """Write a prepared document; the caller owns the transaction"""
+        content = prepared.content
+        
+        # Drop the chunks and tags of any previous version of this URL
+        cursor.execute("""
+            DELETE FROM embeddings WHERE content_id IN (SELECT id FROM web_content WHERE url = ?)
+        """, (content.url,))
+        cursor.execute("""
+            DELETE FROM content_tags WHERE content_id IN (SELECT id FROM web_content WHERE url = ?)
+        """, (content.url,))
+        
+        cursor.execute("""
+            INSERT OR REPLACE INTO web_content 
+            (url, content, timestamp, title, tags, summary, domain)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            content.url,
+            content.content,
+            content.timestamp,
+            content.metadata['title'],
+            ','.join(content.metadata['tags']),
+            prepared.summary,
+            urlparse(content.url).netloc
+        ))
+        content_id = cursor.lastrowid
+        write_tags(cursor, content_id, content.metadata['tags'])
+        
+        cursor.executemany("""
+            INSERT INTO embeddings 
+            (content_id, chunk_text, embedding, key_points)
+            VALUES (?, ?, ?, ?)
+        """, [
+            (content_id, chunk, embedding.tobytes(), '||'.join(key_points))
+            for chunk, embedding, key_points in zip(prepared.chunks, prepared.embeddings, prepared.key_points)
+        ])
+
     def store_content(self, content: WebContent):
+        with self.profiler.maybe_profile('ingest', content.url):
+            self.store_prepared(self.prepare_content(content))
+    
+    def store_prepared(self, prepared: PreparedContent):
+        """Write a document prepared by prepare_content (possibly on another thread)"""
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Generate summary for the entire content
-            summary = self.generate_summary(content.content)
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO web_content 
-                (url, content, timestamp, title, tags, summary)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                content.url,
-                content.content,
-                content.timestamp,
-                content.metadata['title'],
-                ','.join(content.metadata['tags']),
-                summary
-            ))
-            content_id = cursor.lastrowid
-            
-            # Process and store chunks with key points
-            chunks = self._chunk_text(content.content)
-            for chunk in chunks:
-                embedding = self._compute_embedding(chunk)
-                key_points = self.extract_key_points(chunk)
-                
-                cursor.execute("""
-                    INSERT INTO embeddings 
-                    (content_id, chunk_text, embedding, key_points)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    content_id, 
-                    chunk, 
-                    embedding.tobytes(),
-                    '||'.join(key_points)
-                ))
-            
+            self.write_prepared(conn.cursor(), prepared)
             conn.commit()
+        
+        self.invalidate_filter_index()
 
 # Test function to verify everything works
 def test_system():
@@ -0,0 +1,399 @@
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from encoders import Encoder, get_encoder
+from profiling import SlowQueryLog, Profiler, StageTimer
+from scraper import AISearchSystem, WebContent, PreparedContent, write_tags
+from suggest import PrefixIndex, RefreshingPrefixIndex
+
+ROUTE_BY_URL = 'url'
+ROUTE_BY_DOMAIN = 'domain'
+CONFIG_FILE = "shards.json"
+DEFAULT_SHARDS = 4
+
+
+def shard_file_name(index: int) -> str:
+    return f"knowledge_base.shard{index}.db"
+
+
+class ShardedSearchSystem:
+    """Knowledge base split across several SQLite files with scatter-gather search
+
+    Offers the same interface the server, loaders and ingestors use on
+    AISearchSystem, so either can be served or loaded into.
+    """
+
+    def __init__(self, shard_dir: str = None, num_shards: int = None,
+                 route_by: str = None, max_workers: int = None,
+                 encoder: Encoder = None, reembed: bool = False,
+                 slow_query_log: SlowQueryLog = None, profiler: Profiler = None):
+        if shard_dir is None:
+            shard_dir = os.path.join(os.path.dirname(__file__), "shards")
+        if route_by not in (None, ROUTE_BY_URL, ROUTE_BY_DOMAIN):
+            raise ValueError(f"route_by must be '{ROUTE_BY_URL}' or '{ROUTE_BY_DOMAIN}', got {route_by!r}")
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.config_path = os.path.join(shard_dir, CONFIG_FILE)
+
+        # An existing layout wins over constructor arguments; changing it goes through rebalance()
+        config = self._load_config()
+        if config and ((num_shards and config['num_shards'] != num_shards)
+                       or (route_by and config['route_by'] != route_by)):
+            print(f"Using existing shard layout from {self.config_path}: "
+                  f"{config['num_shards']} shards routed by {config['route_by']}")
+        self.num_shards = config['num_shards'] if config else num_shards or DEFAULT_SHARDS
+        self.route_by = config['route_by'] if config else route_by or ROUTE_BY_URL
+        if not config:
+            # Only written for a new layout, so a read-only copy (a snapshot) stays untouched
+            self._save_config()
+
+        self.encoder = encoder or get_encoder()
+        self.reembed = reembed
+        # Searches are timed and logged once here, not again in each shard
+        self.slow_query_log = slow_query_log or SlowQueryLog()
+        self.profiler = profiler or Profiler()
+        self._prefix_index = RefreshingPrefixIndex(self._build_prefix_index, self.content_version)
+        self.shards: List[AISearchSystem] = [self._open_shard(i) for i in range(self.num_shards)]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or self.num_shards)
+
+        if config and config.get('rebalancing_from'):
+            print(f"Finishing an interrupted rebalance of {self.shard_dir}")
+            self._finish_rebalance(config['rebalancing_from']['num_shards'])
+
+    def _load_config(self) -> Optional[Dict]:
+        if not os.path.exists(self.config_path):
+            return None
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_config(self, rebalancing_from: Dict = None):
+        config = {'num_shards': self.num_shards, 'route_by': self.route_by}
+        if rebalancing_from:
+            config['rebalancing_from'] = rebalancing_from
+        # Written aside and renamed so a crash never leaves a half-written layout
+        tmp_path = f"{self.config_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, self.config_path)
+
+    def _shard_path(self, index: int) -> str:
+        return os.path.join(self.shard_dir, shard_file_name(index))
+
+    def _open_shard(self, index: int) -> AISearchSystem:
+        return AISearchSystem(self._shard_path(index), encoder=self.encoder, reembed=self.reembed,
+                              slow_query_log=SlowQueryLog(''), profiler=self.profiler)
+
+    def shard_for(self, url: str, num_shards: int = None, route_by: str = None) -> int:
+        """Return the shard index a URL belongs to"""
+        num_shards = num_shards or self.num_shards
+        route_by = route_by or self.route_by
+        key = urlparse(url).netloc if route_by == ROUTE_BY_DOMAIN else url
+        # md5 rather than hash(): routing has to be stable across processes
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+        return int(digest, 16) % num_shards
+
+    def system_for(self, url: str) -> AISearchSystem:
+        """Return the shard a URL is stored in"""
+        return self.shards[self.shard_for(url)]
+
+    def store_content(self, content: WebContent):
+        """Store WebContent in the shard its URL routes to"""
+        self.system_for(content.url).store_content(content)
+        self._prefix_index.invalidate()
+
+    def prepare_content(self, content: WebContent) -> PreparedContent:
+        """Summarise, chunk and embed a document; the same for every shard"""
+        return self.shards[0].prepare_content(content)
+
+    def store_prepared(self, prepared: PreparedContent):
+        """Write a document prepared by prepare_content to the shard its URL routes to"""
+        self.system_for(prepared.content.url).store_prepared(prepared)
+        self._prefix_index.invalidate()
+
+    def invalidate_filter_index(self):
+        """Drop every shard's in-memory indexes after writes that bypassed store_content"""
+        for shard in self.shards:
+            shard.invalidate_filter_index()
+        self._prefix_index.invalidate()
+
+    def prefix_index(self) -> PrefixIndex:
+        """Return the suggestion index over all shards; after content changes it refreshes in the background"""
+        return self._prefix_index.get()
+
+    def content_version(self) -> Tuple:
+        return tuple(shard.content_version() for shard in self.shards)
+
+    def _build_prefix_index(self) -> PrefixIndex:
+        conns = [sqlite3.connect(shard.db_path) for shard in self.shards]
+        try:
+            return PrefixIndex(conns)
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def suggest(self, prefix: str, limit: int = 8) -> Dict:
+        """Prefix completions and document previews for search-as-you-type"""
+        return self.prefix_index().suggest(prefix, limit)
+
+    def warm_up(self):
+        """Build every shard's in-memory indexes and pull the vectors into the page cache before serving"""
+        query_embedding = self.shards[0]._compute_embedding("warm up")
+        for shard in self.shards:
+            shard.filter_index()
+            shard.search_by_embedding(query_embedding, top_k=1)
+        self.prefix_index()
+
+    def semantic_search(self, query: str, top_k: int = 5, shards: List[int] = None,
+                        tags: List[str] = None, domain: Union[str, List[str]] = None,
+                        since=None, until=None) -> Dict:
+        """Search all (or only the selected) shards in parallel and merge their top_k lists
+
+        Shards are filtered, fetched and scored concurrently, so the slow query
+        log gets the wall time of that as 'search', each shard's own time in
+        shard_ms, and document and chunk counts summed over the shards.
+        """
+        timer = StageTimer()
+        entry = {
+            'query': query,
+            'top_k': top_k,
+            'filters': {k: v for k, v in
+                        {'tags': tags, 'domain': domain, 'since': since, 'until': until}.items() if v},
+        }
+
+        def search_shard(shard: AISearchSystem):
+            # Runs on an executor thread, which the search's own profile can't see
+            with self.profiler.include_thread(session):
+                shard_timer = StageTimer()
+                index = shard.filter_index()
+                content_ids = index.candidates(tags, domain, since, until)
+                shard_timer.counts['corpus_docs'] = len(index.all_ids)
+                shard_timer.counts['candidate_docs'] = len(index.all_ids) if content_ids is None else len(content_ids)
+                results = shard.search_by_embedding(query_embedding, top_k, content_ids, shard_timer)
+            return results, shard_timer
+
+        # A bad shard index is the caller's mistake, not an empty result
+        if shards is not None:
+            invalid = [i for i in shards if not isinstance(i, int) or not 0 <= i < self.num_shards]
+            if invalid:
+                raise ValueError(f"shards must be indices from 0 to {self.num_shards - 1}, got {invalid}")
+        selected = self.shards if shards is None else [self.shards[i] for i in shards]
+
+        with self.profiler.maybe_profile('search', query) as session:
+            with timer.stage('encode'):
+                query_embedding = self.shards[0]._compute_embedding(query)
+
+            try:
+                with timer.stage('search'):
+                    per_shard = list(self.executor.map(search_shard, selected))
+                for _, shard_timer in per_shard:
+                    for name, count in shard_timer.counts.items():
+                        timer.counts[name] = timer.counts.get(name, 0) + count
+                entry['shard_ms'] = [round(shard_timer.total_ms, 3) for _, shard_timer in per_shard]
+
+                with timer.stage('merge'):
+                    top_results = heapq.nlargest(
+                        top_k, itertools.chain.from_iterable(results for results, _ in per_shard),
+                        key=lambda r: r['similarity']
+                    )
+
+                with timer.stage('summarize'):
+                    combined_text = ' '.join(r['chunk'] for r in top_results)
+                    overall_summary = self.shards[0].generate_summary(combined_text)
+
+                response = {
+                    'results': top_results,
+                    'overall_summary': overall_summary
+                }
+
+            except sqlite3.Error as e:
+                print(f"Database error: {e}")
+                entry['error'] = f"Database error: {e}"
+                response = {'results': [], 'overall_summary': ''}
+            except Exception as e:
+                print(f"Error during search: {e}")
+                entry['error'] = f"Error during search: {e}"
+                response = {'results': [], 'overall_summary': ''}
+
+        self.slow_query_log.record({
+            **entry,
+            **timer.counts,
+            'result_count': len(response['results']),
+            'stages_ms': timer.as_dict(),
+            'total_ms': round(timer.total_ms, 3),
+        })
+        return response
+
+    def shard_sizes(self) -> List[int]:
+        """Number of documents stored in each shard"""
+        sizes = []
+        for shard in self.shards:
+            with sqlite3.connect(shard.db_path) as conn:
+                sizes.append(conn.execute("SELECT COUNT(*) FROM web_content").fetchone()[0])
+        return sizes
+
+    def import_database(self, db_path: str) -> int:
+        """Split an existing single-file knowledge base into the shards"""
+        # Opening it once migrates older databases to the current schema
+        AISearchSystem(db_path, encoder=self.encoder, reembed=self.reembed)
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute("SELECT id, url FROM web_content").fetchall()
+
+        for content_id, url in rows:
+            _copy_document(db_path, content_id, self.shards[self.shard_for(url)].db_path)
+
+        self.invalidate_filter_index()
+        print(f"Imported {len(rows)} documents from {db_path}")
+        return len(rows)
+
+    def rebalance(self, num_shards: int = None, route_by: str = None) -> int:
+        """Change the shard count and/or routing key and move documents to their new shards
+
+        The new layout is saved before anything moves, so new writes already
+        land in their final shard. Moves are safe to repeat, and a rebalance
+        that was interrupted is finished the next time the shards are opened.
+        """
+        previous = {'num_shards': self.num_shards, 'route_by': self.route_by}
+        self.num_shards = num_shards or self.num_shards
+        self.route_by = route_by or self.route_by
+        self._save_config(rebalancing_from=previous)
+
+        old_shards = self.shards
+        self.shards = [
+            old_shards[i] if i < len(old_shards) else self._open_shard(i)
+            for i in range(self.num_shards)
+        ]
+        moved = self._finish_rebalance(previous['num_shards'])
+
+        self.executor.shutdown(wait=True)
+        self.executor = ThreadPoolExecutor(max_workers=self.num_shards)
+        return moved
+
+    def _finish_rebalance(self, old_num_shards: int) -> int:
+        """Move every document that routes to another shard, then drop the rebalancing marker"""
+        # Shards beyond the new count are emptied and removed; some may be gone already
+        retired = [
+            self._open_shard(i) for i in range(self.num_shards, old_num_shards)
+            if os.path.exists(self._shard_path(i))
+        ]
+
+        moved = 0
+        for shard in self.shards + retired:
+            with sqlite3.connect(shard.db_path) as conn:
+                rows = conn.execute("SELECT id, url FROM web_content").fetchall()
+
+            for content_id, url in rows:
+                target = self.system_for(url)
+                if target is not shard:
+                    _move_document(shard.db_path, content_id, url, target.db_path)
+                    moved += 1
+
+        for shard in retired:
+            os.remove(shard.db_path)
+
+        self.invalidate_filter_index()
+        self._save_config()
+
+        print(f"Rebalanced into {self.num_shards} shards by {self.route_by}, moved {moved} documents")
+        return moved
+
+
+def _copy_document(src_path: str, content_id: int, dst_path: str):
+    """Copy one web_content row and its embeddings between databases without re-embedding"""
+    with sqlite3.connect(src_path) as src:
+        document = src.execute("""
+            SELECT url, content, timestamp, title, tags, summary, domain
+            FROM web_content WHERE id = ?
+        """, (content_id,)).fetchone()
+        tags = [row[0] for row in src.execute("""
+            SELECT t.name FROM content_tags ct
+            JOIN tags t ON ct.tag_id = t.id
+            WHERE ct.content_id = ?
+        """, (content_id,))]
+        chunks = src.execute("""
+            SELECT chunk_text, embedding, key_points
+            FROM embeddings WHERE content_id = ?
+        """, (content_id,)).fetchall()
+
+    with sqlite3.connect(dst_path) as dst:
+        # Drop any stale copy so its embeddings don't linger
+        existing = dst.execute("SELECT id FROM web_content WHERE url = ?", (document[0],)).fetchone()
+        if existing:
+            _delete_rows(dst, existing[0])
+
+        cursor = dst.execute("""
+            INSERT INTO web_content (url, content, timestamp, title, tags, summary, domain)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, document)
+        new_id = cursor.lastrowid
+        write_tags(cursor, new_id, tags)
+        dst.executemany("""
+            INSERT INTO embeddings (content_id, chunk_text, embedding, key_points)
+            VALUES (?, ?, ?, ?)
+        """, [(new_id, *chunk) for chunk in chunks])
+
+
+def _move_document(src_path: str, content_id: int, url: str, dst_path: str):
+    """Move a document between databases; repeating a move that was cut short is harmless"""
+    with sqlite3.connect(dst_path) as dst:
+        present = dst.execute("SELECT 1 FROM web_content WHERE url = ?", (url,)).fetchone()
+    # A copy already in the target was made before an interruption or written
+    # there under the new layout since; either way it is the one to keep
+    if not present:
+        _copy_document(src_path, content_id, dst_path)
+    _delete_document(src_path, content_id)
+
+
+def _delete_rows(conn: sqlite3.Connection, content_id: int):
+    conn.execute("DELETE FROM embeddings WHERE content_id = ?", (content_id,))
+    conn.execute("DELETE FROM content_tags WHERE content_id = ?", (content_id,))
+    conn.execute("DELETE FROM web_content WHERE id = ?", (content_id,))
+
+
+def _delete_document(db_path: str, content_id: int):
+    with sqlite3.connect(db_path) as conn:
+        _delete_rows(conn, content_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage knowledge base shards")
+    parser.add_argument('--shard-dir', default=None, help="Directory holding the shard databases")
+    parser.add_argument('--encoder', default=None, help="Encoder the shards were built with (see encoders.get_encoder)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebalance_parser = subparsers.add_parser('rebalance', help="Change shard count or routing")
+    rebalance_parser.add_argument('--shards', type=int, default=None)
+    rebalance_parser.add_argument('--route-by', choices=[ROUTE_BY_URL, ROUTE_BY_DOMAIN], default=None)
+
+    import_parser = subparsers.add_parser('import', help="Split a single knowledge_base.db into shards")
+    import_parser.add_argument('db_path')
+    import_parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS)
+    import_parser.add_argument('--route-by', choices=[ROUTE_BY_URL, ROUTE_BY_DOMAIN], default=ROUTE_BY_URL)
+
+    subparsers.add_parser('stats', help="Show documents per shard")
+
+    args = parser.parse_args()
+    encoder = get_encoder(args.encoder)
+
+    if args.command == 'import':
+        system = ShardedSearchSystem(args.shard_dir, num_shards=args.shards, route_by=args.route_by,
+                                     encoder=encoder)
+        system.import_database(args.db_path)
+    else:
+        system = ShardedSearchSystem(args.shard_dir, encoder=encoder)
+        if args.command == 'rebalance':
+            system.rebalance(num_shards=args.shards, route_by=args.route_by)
+
+    for index, size in enumerate(system.shard_sizes()):
+        print(f"Shard {index}: {size} documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DB_FILE = "knowledge_base.db"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+# A build or import directory untouched for this long was abandoned, not in progress
+STALE_TMP_SECONDS = 3600
+
+
+class SnapshotError(Exception):
+    """A snapshot is missing, incomplete or fails its checksums"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _last_modified(path: str) -> float:
+    """Newest mtime of a directory or anything inside it"""
+    newest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return newest
+
+
+def _write_atomic(path: str, text: str):
+    """Replace path with text so readers see either the old or the new file, never half of one"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotManager:
+    """Versioned, immutable copies of the knowledge base for serving and replication
+
+    Each snapshot is a directory holding the SQLite database (or every shard
+    database and the shard layout) and a manifest with sha256 checksums. CURRENT names
+    the snapshot servers should load. Snapshots are never modified once
+    built, so copying a directory to another node (rsync, scp) and running
+    import_snapshot there is enough to set up a read replica.
+    """
+
+    def __init__(self, snapshot_dir: str = None, keep: int = 3):
+        if snapshot_dir is None:
+            snapshot_dir = os.path.join(os.path.dirname(__file__), "snapshots")
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.snapshot_dir = snapshot_dir
+        self.keep = keep
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.snapshot_dir, name)
+
+    def db_path(self, name: str) -> str:
+        return os.path.join(self.path(name), DB_FILE)
+
+    def list(self) -> List[str]:
+        """Complete snapshots, oldest first by the build time in their manifests"""
+        names = [
+            name for name in os.listdir(self.snapshot_dir)
+            if not name.startswith('.') and os.path.exists(os.path.join(self.path(name), MANIFEST_FILE))
+        ]
+        return sorted(names, key=lambda name: (self.manifest(name)['created_at'], name))
+
+    def manifest(self, name: str) -> Dict:
+        manifest_path = os.path.join(self.path(name), MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"No snapshot named {name!r} in {self.snapshot_dir}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def current(self) -> Optional[str]:
+        current_path = os.path.join(self.snapshot_dir, CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+
+    def build(self, db_path: str = None, name: str = None, publish: bool = False,
+              shard_dir: str = None) -> str:
+        """Copy a live knowledge base into a new snapshot and return its name
+
+        Uses SQLite's backup API, so the source can keep taking writes while
+        the copy is made. The snapshot only appears under its final name once
+        the database and manifest are complete. With shard_dir, every shard
+        database and the shard layout are copied instead of db_path.
+        """
+        if (db_path is None) == (shard_dir is None):
+            raise ValueError("Pass exactly one of db_path and shard_dir")
+        name = name or datetime.now().strftime('%Y%m%d-%H%M%S')
+        if os.path.exists(self.path(name)):
+            raise SnapshotError(f"Snapshot {name!r} already exists")
+
+        layout = None
+        if shard_dir:
+            from shards import CONFIG_FILE, shard_file_name
+            with open(os.path.join(shard_dir, CONFIG_FILE), 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            if layout.get('rebalancing_from'):
+                raise SnapshotError(f"{shard_dir} is part way through a rebalance; open it to finish first")
+            sources = {
+                shard_file_name(i): os.path.join(shard_dir, shard_file_name(i))
+                for i in range(layout['num_shards'])
+            }
+        else:
+            sources = {DB_FILE: db_path}
+
+        tmp_dir = self.path(f".{name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            meta, documents, chunks = None, 0, 0
+            for file_name, source in sources.items():
+                tmp_db = os.path.join(tmp_dir, file_name)
+                src, dst = sqlite3.connect(source), sqlite3.connect(tmp_db)
+                try:
+                    src.backup(dst)
+                finally:
+                    src.close()
+                    dst.close()
+
+                conn = sqlite3.connect(tmp_db)
+                try:
+                    file_meta = dict(conn.execute("SELECT key, value FROM index_meta"))
+                    if 'encoder_space' not in file_meta:
+                        raise SnapshotError(f"{source} has no encoder recorded; open it with AISearchSystem first")
+                    if meta and file_meta['encoder_space'] != meta['encoder_space']:
+                        raise SnapshotError(f"{source} was embedded with {file_meta['encoder_space']}, "
+                                            f"other shards with {meta['encoder_space']}")
+                    meta = meta or file_meta
+                    documents += conn.execute("SELECT COUNT(*) FROM web_content").fetchone()[0]
+                    chunks += conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                    conn.execute("VACUUM")
+                finally:
+                    # Closed before hashing so the checksum covers the final bytes
+                    conn.close()
+            if layout:
+                _write_atomic(os.path.join(tmp_dir, CONFIG_FILE), json.dumps(layout, indent=2))
+
+            manifest = {
+                'name': name,
+                'created_at': datetime.now().isoformat(),
+                'source': os.path.abspath(shard_dir or db_path),
+                'encoder': {
+                    'space': meta['encoder_space'],
+                    'dim': int(meta['encoder_dim']),
+                    'name': meta.get('encoder_name'),
+                },
+                'documents': documents,
+                'chunks': chunks,
+                'files': {
+                    file_name: {
+                        'sha256': _sha256(os.path.join(tmp_dir, file_name)),
+                        'size': os.path.getsize(os.path.join(tmp_dir, file_name)),
+                    }
+                    for file_name in sorted(os.listdir(tmp_dir))
+                },
+            }
+            if layout:
+                manifest['shards'] = layout
+            _write_atomic(os.path.join(tmp_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+            os.replace(tmp_dir, self.path(name))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        print(f"Built snapshot {name}: {documents} documents, {chunks} chunks"
+              + (f" in {layout['num_shards']} shards" if layout else ""))
+        if publish:
+            self.publish(name)
+        return name
+
+    def verify(self, name: str) -> Dict:
+        """Check every file against the manifest; returns the manifest or raises SnapshotError"""
+        manifest = self.manifest(name)
+        for file_name, expected in manifest['files'].items():
+            file_path = os.path.join(self.path(name), file_name)
+            if not os.path.exists(file_path):
+                raise SnapshotError(f"Snapshot {name} is missing {file_name}")
+            if os.path.getsize(file_path) != expected['size'] or _sha256(file_path) != expected['sha256']:
+                raise SnapshotError(f"Snapshot {name}: checksum mismatch for {file_name}")
+        return manifest
+
+    def publish(self, name: str):
+        """Point CURRENT at a verified snapshot"""
+        self.verify(name)
+        _write_atomic(os.path.join(self.snapshot_dir, CURRENT_FILE), name + '\n')
+        print(f"Published snapshot {name}")
+
+    def previous(self, name: str = None) -> Optional[str]:
+        """The newest snapshot built before name (default: CURRENT)"""
+        name = name or self.current()
+        snapshots = self.list()
+        if name is None:
+            return snapshots[-1] if snapshots else None
+        if name not in snapshots:
+            return None
+        index = snapshots.index(name)
+        return snapshots[index - 1] if index > 0 else None
+
+    def rollback(self) -> str:
+        """Publish the snapshot built before the current one and return its name"""
+        current = self.current()
+        target = self.previous(current) if current else None
+        if target is None:
+            raise SnapshotError("No older snapshot to roll back to")
+        self.publish(target)
+        return target
+
+    def import_snapshot(self, source_dir: str) -> str:
+        """Copy a snapshot directory from elsewhere (e.g. another node) in, verifying it"""
+        name = os.path.basename(os.path.normpath(source_dir))
+        if os.path.exists(self.path(name)):
+            raise SnapshotError(f"Snapshot {name!r} already exists")
+        tmp_dir = self.path(f".{name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.copytree(source_dir, tmp_dir)
+        try:
+            self.verify(os.path.basename(tmp_dir))
+        except SnapshotError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        os.replace(tmp_dir, self.path(name))
+        return name
+
+    def gc(self, keep: int = None, protect: List[str] = None) -> List[str]:
+        """Delete all but the newest `keep` snapshots; CURRENT and `protect` are always kept"""
+        keep = self.keep if keep is None else keep
+        snapshots = self.list()
+        kept = set(snapshots[-keep:] if keep > 0 else [])
+        kept.add(self.current())
+        kept.update(protect or [])
+
+        removed = []
+        for name in snapshots:
+            if name not in kept:
+                shutil.rmtree(self.path(name), ignore_errors=True)
+                removed.append(name)
+        # Leftovers from builds or imports that were interrupted; recently touched
+        # ones may belong to another process still writing them
+        for name in os.listdir(self.snapshot_dir):
+            tmp_dir = self.path(name)
+            if (name.startswith('.') and name.endswith('.tmp') and os.path.isdir(tmp_dir)
+                    and time.time() - _last_modified(tmp_dir) > STALE_TMP_SECONDS):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        if removed:
+            print(f"Removed snapshots: {', '.join(removed)}")
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and manage knowledge base snapshots")
+    parser.add_argument('--snapshot-dir', default=None)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Snapshot a knowledge base")
+    build.add_argument('--db', default=os.path.join(os.path.dirname(__file__), "knowledge_base.db"))
+    build.add_argument('--shards', default=None, metavar='DIR',
+                       help="Snapshot the sharded knowledge base in DIR instead of --db")
+    build.add_argument('--name', default=None)
+    build.add_argument('--load', action='store_true', help="Crawl and ingest into --db first")
+    build.add_argument('--encoder', choices=['auto', 'transformer', 'onnx', 'hashing'], default=None)
+    build.add_argument('--publish', action='store_true', help="Make it CURRENT once built")
+    build.add_argument('--keep', type=int, default=3, help="Snapshots to keep after building")
+
+    sub.add_parser('list', help="List snapshots")
+    verify = sub.add_parser('verify', help="Check a snapshot against its manifest")
+    verify.add_argument('name')
+    publish = sub.add_parser('publish', help="Make a snapshot CURRENT")
+    publish.add_argument('name')
+    sub.add_parser('rollback', help="Make the previous snapshot CURRENT")
+    import_cmd = sub.add_parser('import', help="Copy in a snapshot directory from another node")
+    import_cmd.add_argument('source')
+    gc = sub.add_parser('gc', help="Delete old snapshots")
+    gc.add_argument('--keep', type=int, default=3)
+    args = parser.parse_args()
+
+    manager = SnapshotManager(args.snapshot_dir)
+    if args.command == 'build':
+        if args.load:
+            from main import DataLoader
+            from scraper import AISearchSystem
+            from shards import ShardedSearchSystem
+            from encoders import get_encoder
+            encoder = get_encoder(args.encoder)
+            if args.shards:
+                search_system = ShardedSearchSystem(args.shards, encoder=encoder)
+            else:
+                search_system = AISearchSystem(args.db, encoder=encoder)
+            DataLoader(search_system).load_initial_data()
+        if args.shards:
+            manager.build(shard_dir=args.shards, name=args.name, publish=args.publish)
+        else:
+            manager.build(args.db, name=args.name, publish=args.publish)
+        manager.gc(args.keep)
+    elif args.command == 'list':
+        current = manager.current()
+        for name in manager.list():
+            manifest = manager.manifest(name)
+            marker = '*' if name == current else ' '
+            shards = f"  {manifest['shards']['num_shards']} shards" if manifest.get('shards') else ''
+            print(f"{marker} {name}  {manifest['documents']} documents  {manifest['encoder']['space']}{shards}")
+    elif args.command == 'verify':
+        manager.verify(args.name)
+        print(f"Snapshot {args.name} OK")
+    elif args.command == 'publish':
+        manager.publish(args.name)
+    elif args.command == 'rollback':
+        manager.rollback()
+    elif args.command == 'import':
+        print(f"Imported snapshot {manager.import_snapshot(args.source)}")
+    elif args.command == 'gc':
+        manager.gc(args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import bisect
+import heapq
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+# Title text outranks tags, which outrank words that only appear in the body
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+CONTENT_WEIGHT = 1
+
+# Body terms are only worth suggesting once they show up in a few documents
+MIN_CONTENT_DOCS = 2
+MAX_CONTENT_TERMS = 50000
+# Documents kept per term; previews only ever show the best few
+MAX_DOCS_PER_TERM = 16
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do for from has have how i if in into is it its not of on or
+our so than that the their them then there these they this to was we what when which who will
+with you your
+""".split())
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD.findall((text or '').lower()) if len(w) > 1 and w not in STOP_WORDS]
+
+
+class PrefixIndex:
+    """Sorted term array over titles, tags and frequent body terms for search-as-you-type
+
+    Lookups are two bisects into the sorted terms plus a top-k over the
+    matching slice, so they never touch the embedding model. Built from one
+    database or several (the shards of a ShardedSearchSystem), in which case
+    term weights are global and documents are keyed by (database, id).
+    """
+
+    def __init__(self, conns: Union[sqlite3.Connection, List[sqlite3.Connection]]):
+        if isinstance(conns, sqlite3.Connection):
+            conns = [conns]
+        weights: Counter = Counter()
+        term_docs: Dict[str, Counter] = {}
+        content_df: Counter = Counter()
+        content_terms: Dict[Tuple[int, int], set] = {}
+        self.documents: Dict[Tuple[int, int], Tuple[str, str]] = {}
+
+        def add(term: str, doc: Tuple[int, int], weight: int):
+            weights[term] += weight
+            term_docs.setdefault(term, Counter())[doc] += weight
+
+        for source, conn in enumerate(conns):
+            for content_id, url, title, content in conn.execute(
+                "SELECT id, url, title, content FROM web_content"
+            ):
+                doc = (source, content_id)
+                title = (title or url).strip()
+                self.documents[doc] = (title, url)
+                # The whole title completes from its start, each of its words on its own
+                add(' '.join(title.lower().split()), doc, TITLE_WEIGHT)
+                for word in set(_words(title)):
+                    add(word, doc, TITLE_WEIGHT)
+                terms = set(_words(content))
+                content_df.update(terms)
+                content_terms[doc] = terms
+
+            for name, content_id in conn.execute("""
+                SELECT t.name, ct.content_id
+                FROM content_tags ct
+                JOIN tags t ON ct.tag_id = t.id
+            """):
+                add(name.lower(), (source, content_id), TAG_WEIGHT)
+
+        frequent = {
+            term for term, df in content_df.most_common(MAX_CONTENT_TERMS) if df >= MIN_CONTENT_DOCS
+        }
+        for doc, terms in content_terms.items():
+            for term in terms & frequent:
+                add(term, doc, CONTENT_WEIGHT)
+
+        self.terms = sorted(weights)
+        self.weights = [weights[term] for term in self.terms]
+        self.term_docs = [
+            [doc for doc, _ in term_docs[term].most_common(MAX_DOCS_PER_TERM)]
+            for term in self.terms
+        ]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def complete(self, prefix: str, limit: int = 8) -> List[int]:
+        """Positions in self.terms of the heaviest terms starting with prefix"""
+        if not prefix:
+            return []
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + '\uffff', lo)
+        return heapq.nlargest(limit, range(lo, hi), key=lambda i: self.weights[i])
+
+    def suggest(self, query: str, limit: int = 8) -> Dict:
+        """Completions for what has been typed so far, plus title/URL previews of matching documents"""
+        typed = ' '.join(query.lower().split())
+        if not typed:
+            return {'query': query, 'completions': [], 'documents': []}
+
+        # Whole-title matches first, then completions of the word being typed
+        positions = self.complete(typed, limit)
+        head, _, last = typed.rpartition(' ')
+        if head:
+            positions += [i for i in self.complete(last, limit) if i not in positions]
+
+        completions, documents, seen = [], [], set()
+        for i in positions:
+            term = self.terms[i]
+            completion = term if term.startswith(typed) else f"{head} {term}"
+            if completion not in completions:
+                completions.append(completion)
+            for doc in self.term_docs[i]:
+                title, url = self.documents[doc]
+                # Pages like /docs and /docs#main share a title; preview one of them
+                if title not in seen and len(documents) < limit:
+                    seen.add(title)
+                    documents.append({'title': title, 'url': url})
+
+        return {'query': query, 'completions': completions[:limit], 'documents': documents}
+
+
+class RefreshingPrefixIndex:
+    """Holds a PrefixIndex, built on first use and rebuilt in the background after invalidate()
+
+    Suggestions tolerate being briefly out of date, so after content changes
+    the old index keeps answering while the new one is built, and typing
+    never waits for a rebuild. If version is given it is polled on every
+    lookup, so writes made by other processes also trigger a rebuild.
+    """
+
+    def __init__(self, build: Callable[[], PrefixIndex], version: Callable[[], Hashable] = None):
+        self.build = build
+        self.version = version
+        self._built_version = None
+        self._index: Optional[PrefixIndex] = None
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def get(self) -> PrefixIndex:
+        if self.version is not None:
+            version = self.version()
+            if version != self._built_version:
+                self._built_version = version
+                self._stale = True
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._stale = False
+                    self._index = self.build()
+        elif self._stale and self._lock.acquire(blocking=False):
+            self._stale = False
+            threading.Thread(target=self._refresh, name="prefix-index", daemon=True).start()
+        return self._index
+
+    def _refresh(self):
+        try:
+            self._index = self.build()
+        except sqlite3.Error as e:
+            print(f"Error rebuilding suggestion index: {e}")
+        finally:
+            self._lock.release()